@@ -0,0 +1,293 @@
+import asyncio
+import hashlib
+import itertools
+import time
+
+FRAME_SIZE = 3840
+
+_ids = itertools.count(10_000)
+
+
+def next_id():
+    return next(_ids)
+
+
+class FakeYDL:
+    """Stands in for YDLPool: returns canned info after ``latency`` seconds."""
+
+    def __init__(self, latency=0.05, frames=50):
+        self.latency = latency
+        self.frames = frames
+        self.calls = 0
+
+    def extract_info(self, query, **kwargs):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        video_id = hashlib.sha1(query.encode()).hexdigest()[:11]
+        expire = int(time.time()) + 6 * 3600
+        return {
+            "id": video_id,
+            "title": f"Bench track {query}",
+            "url": f"https://bench.invalid/{video_id}?expire={expire}",
+            "webpage_url": f"https://www.youtube.com/watch?v={video_id}",
+            "duration": self.frames * 0.02,
+            "thumbnail": None,
+            "uploader": "Bench",
+            "view_count": 1234,
+            "acodec": "opus",
+            "asr": 48000,
+        }
+
+    def close(self):
+        pass
+
+
+class FakeSource:
+    """Emits ``frames`` silent 20 ms PCM frames, then EOF."""
+
+    def __init__(self, frames):
+        self.remaining = frames
+        self.cleaned = False
+
+    def read(self):
+        if self.remaining <= 0:
+            return b""
+        self.remaining -= 1
+        return b"\0" * FRAME_SIZE
+
+    def is_opus(self):
+        return False
+
+    def cleanup(self):
+        self.cleaned = True
+
+
+class FakeVoiceClient:
+    """Drains sources on the event loop instead of a real-time player thread.
+
+    ``frame_delay`` is slept every 50 frames, so 0 runs as fast as the
+    loop allows and 1.0 approximates real-time playback.
+    """
+
+    def __init__(self, channel, frame_delay=0.0):
+        self.channel = channel
+        self.frame_delay = frame_delay
+        self.source = None
+        self.gaps = []
+        self._connected = True
+        self._playing = False
+        self._paused = False
+        self._stopped = False
+        self._ended_at = None
+        self._task = None
+
+    def play(self, source, *, after=None):
+        self.source = source
+        self._playing = True
+        self._paused = False
+        self._stopped = False
+        self._task = asyncio.get_running_loop().create_task(self._pump(source, after))
+
+    async def _pump(self, source, after):
+        first = True
+        frames = 0
+        while not self._stopped:
+            if self._paused:
+                await asyncio.sleep(0.005)
+                continue
+            data = source.read()
+            if first:
+                first = False
+                if self._ended_at is not None:
+                    self.gaps.append(time.perf_counter() - self._ended_at)
+                    self._ended_at = None
+            if not data:
+                break
+            frames += 1
+            if frames % 50 == 0:
+                await asyncio.sleep(self.frame_delay)
+        self._playing = False
+        source.cleanup()
+        self._ended_at = time.perf_counter()
+        if after is not None:
+            after(None)
+
+    def reset_gaps(self):
+        self.gaps = []
+        self._ended_at = None
+
+    def is_playing(self):
+        return self._playing and not self._paused
+
+    def is_paused(self):
+        return self._paused
+
+    def is_connected(self):
+        return self._connected
+
+    def pause(self):
+        self._paused = True
+
+    def resume(self):
+        self._paused = False
+
+    def stop(self):
+        self._stopped = True
+
+    async def disconnect(self, *, force=False):
+        self._stopped = True
+        self._connected = False
+        self.channel.guild.voice_clients.discard(self)
+
+    async def move_to(self, channel):
+        self.channel = channel
+
+
+class FakeMessage:
+    def __init__(self, channel, content="", author=None, embed=None):
+        self.id = next_id()
+        self.channel = channel
+        self.guild = channel.guild
+        self.content = content
+        self.author = author
+        self.embed = embed
+        self.edits = 0
+
+    async def edit(self, **kwargs):
+        self.edits += 1
+        self.embed = kwargs.get("embed", self.embed)
+        return self
+
+    async def delete(self, *, delay=None):
+        self.channel.deleted_messages += 1
+
+
+class FakeTextChannel:
+    def __init__(self, guild):
+        self.id = next_id()
+        self.guild = guild
+        self.name = f"bench-{self.id}"
+        self.mention = f"<#{self.id}>"
+        self.members = []
+        self.sent = 0
+        self.deleted_messages = 0
+
+    async def send(self, content=None, **kwargs):
+        self.sent += 1
+        return FakeMessage(self, content or "", embed=kwargs.get("embed"))
+
+    async def delete(self):
+        self.guild.channels.pop(self.id, None)
+
+
+class FakeVoiceChannel:
+    def __init__(self, guild, frame_delay=0.0):
+        self.id = next_id()
+        self.guild = guild
+        self.name = f"voice-{self.id}"
+        self.members = []
+        self.frame_delay = frame_delay
+
+    async def connect(self, **kwargs):
+        client = FakeVoiceClient(self, self.frame_delay)
+        self.guild.voice_clients.add(client)
+        return client
+
+
+class FakeVoiceState:
+    def __init__(self, channel):
+        self.channel = channel
+
+
+class FakeMember:
+    def __init__(self, guild, voice_channel):
+        self.id = next_id()
+        self.guild = guild
+        self.bot = False
+        self.display_name = f"user{self.id}"
+        self.mention = f"<@{self.id}>"
+        self.voice = FakeVoiceState(voice_channel)
+        voice_channel.members.append(self)
+
+
+class FakeGuild:
+    def __init__(self, frame_delay=0.0):
+        self.id = next_id()
+        self.channels = {}
+        self.members = {}
+        self.voice_clients = set()
+        self.text_channel = self._add(FakeTextChannel(self))
+        self.voice_channel = self._add(FakeVoiceChannel(self, frame_delay))
+        self.member = FakeMember(self, self.voice_channel)
+        self.members[self.member.id] = self.member
+
+    @property
+    def voice_client(self):
+        return next(iter(self.voice_clients), None)
+
+    def _add(self, channel):
+        self.channels[channel.id] = channel
+        return channel
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_member(self, member_id):
+        return self.members.get(member_id)
+
+    def message(self, content):
+        return FakeMessage(self.text_channel, content, author=self.member)
+
+
+class FakeResponse:
+    def __init__(self):
+        self.calls = 0
+
+    async def send_message(self, *args, **kwargs):
+        self.calls += 1
+
+    async def edit_message(self, *args, **kwargs):
+        self.calls += 1
+
+    async def defer(self, *args, **kwargs):
+        self.calls += 1
+
+
+class FakeInteraction:
+    def __init__(self, guild):
+        self.guild = guild
+        self.user = guild.member
+        self.channel = guild.text_channel
+        self.response = FakeResponse()
+
+
+class FakeBot:
+    def __init__(self, loop):
+        self.loop = loop
+        self.guilds = {}
+        self.channels = {}
+        self.user = None
+
+    def add_guild(self, guild):
+        self.guilds[guild.id] = guild
+        self.channels.update(guild.channels)
+
+    def get_guild(self, guild_id):
+        return self.guilds.get(guild_id)
+
+    def get_channel(self, channel_id):
+        channel = self.channels.get(channel_id)
+        if channel and channel.guild.get_channel(channel_id) is None:
+            return None
+        return channel
+
+    @property
+    def voice_clients(self):
+        return [vc for guild in self.guilds.values() for vc in guild.voice_clients]
+
+    async def wait_until_ready(self):
+        return None
+
+    def get_cog(self, name):
+        return None
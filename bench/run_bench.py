@@ -0,0 +1,304 @@
+"""Offline benchmark and soak harness for the Music cog.
+
+Runs the real cog against the fakes in ``bench.fakes``: no network, no
+Discord token and no ffmpeg. Run from the repository root:
+
+    python -m bench.run_bench --guilds 1,100,1000
+    python -m bench.run_bench --guilds 100 --save-baseline
+    python -m bench.run_bench --guilds 100 --soak 600
+
+Results are compared against ``bench/baselines.json`` when it exists and
+the process exits non-zero if a metric regressed by more than
+``--threshold``.
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# ต้องตั้งค่าก่อน import cog เพราะ Settings อ่าน environment ตอน import
+os.environ.setdefault("STORE_PATH", "")
+os.environ.setdefault("AUDIO_CACHE_DIR", "")
+os.environ.setdefault("EMBED_GLOBAL_RATE", "100000")
+os.environ.setdefault("EMBED_BUCKET_SIZE", "100000")
+os.environ.setdefault("VOICE_IDLE_SECONDS", "0")
+os.environ.setdefault("FFMPEG_MAX_PROCESSES", "0")
+
+from bench.fakes import (  # noqa: E402
+    FakeBot,
+    FakeGuild,
+    FakeInteraction,
+    FakeSource,
+    FakeVoiceState,
+    FakeYDL,
+)
+from cogs.music import Music  # noqa: E402
+from utils.track import Track  # noqa: E402
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baselines.json")
+
+# metric -> True when larger is better
+METRICS = {
+    "enqueue_per_sec": True,
+    "enqueue_p99": False,
+    "bytes_per_guild": False,
+    "gap_p50": False,
+    "gap_p99": False,
+    "controls_per_sec": True,
+    "cleanup_seconds": False,
+    "loop_lag_p99": False,
+}
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class LagSampler:
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(
+                max(0.0, time.perf_counter() - started - self.interval)
+            )
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        self._task.cancel()
+
+
+def tracks_seen(player):
+    if player is None:
+        return 0
+    return len(player.queue) + len(player.history) + (1 if player.current else 0)
+
+
+def make_cog(bot, args):
+    cog = Music(bot)
+    cog.ydl = FakeYDL(latency=args.latency, frames=args.frames)
+    cog.playlist_ydl = cog.ydl
+    cog.search_ydl = cog.ydl
+    cog.build_source = lambda track, transcode=False, seek=0, guild_id=None: FakeSource(
+        args.frames
+    )
+    return cog
+
+
+async def bench_enqueue(cog, guilds, songs):
+    for guild in guilds:
+        cog.music_channels[guild.text_channel.id] = guild.text_channel
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+
+    latencies = []
+
+    async def send(guild, index):
+        started = time.perf_counter()
+        handler = asyncio.create_task(cog.on_message(guild.message(f"song {index}")))
+        # on_message แสดงผล 3 วินาทีก่อนจบ จึงวัดจนถึงตอนที่เพลงเข้าคิว
+        while tracks_seen(cog.players.get(guild.id)) <= index and not handler.done():
+            await asyncio.sleep(0.001)
+        latencies.append(time.perf_counter() - started)
+        return handler
+
+    started = time.perf_counter()
+    handlers = []
+    for index in range(songs):
+        handlers += await asyncio.gather(*(send(guild, index) for guild in guilds))
+    elapsed = time.perf_counter() - started
+
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    await asyncio.gather(*handlers, return_exceptions=True)
+
+    return {
+        "enqueue_per_sec": len(guilds) * songs / elapsed,
+        "enqueue_p99": percentile(latencies, 0.99),
+        "bytes_per_guild": (current - before) / len(guilds),
+    }
+
+
+async def bench_playback(cog, guilds, songs):
+    clients = []
+    for guild in guilds:
+        player = cog.get_player(guild.id)
+        player.channel = guild.text_channel
+        if not player.voice_client:
+            player.voice_client = await guild.voice_channel.connect()
+        # voice ที่ค้างไว้จากรอบ enqueue ไม่นับช่วงว่างระหว่างสองรอบเป็น gap
+        player.voice_client.reset_gaps()
+        for index in range(songs):
+            info = cog.ydl.extract_info(f"{guild.id}-{index}")
+            player.queue.append(Track(info["webpage_url"], guild.member, info))
+        clients.append(player.voice_client)
+
+    await asyncio.gather(
+        *(cog.play_next(guild.id) for guild in guilds if not cog.players[guild.id].current)
+    )
+    while any(
+        cog.players[guild.id].queue or cog.players[guild.id].voice_client.is_playing()
+        for guild in guilds
+    ):
+        await asyncio.sleep(0.05)
+
+    gaps = [gap for client in clients for gap in client.gaps]
+    return {"gap_p50": percentile(gaps, 0.5), "gap_p99": percentile(gaps, 0.99)}
+
+
+async def bench_controls(cog, guilds, rounds):
+    from cogs.music import EnhancedControlButtons
+
+    views = []
+    for guild in guilds:
+        player = cog.get_player(guild.id)
+        if not player.voice_client or not player.voice_client.is_connected():
+            player.voice_client = await guild.voice_channel.connect()
+        player.channel = guild.text_channel
+        views.append((guild, EnhancedControlButtons(cog, player)))
+
+    calls = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for guild, view in views:
+            for item in (view.pause, view.resume, view.toggle_shuffle, view.toggle_loop):
+                await item.callback(FakeInteraction(guild))
+                calls += 1
+    elapsed = time.perf_counter() - started
+    return {"controls_per_sec": calls / elapsed}
+
+
+async def bench_cleanup(cog, guilds):
+    # ทุกคนออกจาก voice พร้อมกัน แล้ววัดเวลาจนกว่า player ทุกตัวถูกคืน
+    started = time.perf_counter()
+    for guild in guilds:
+        member = guild.member
+        before = member.voice
+        if member in before.channel.members:
+            before.channel.members.remove(member)
+        member.voice = FakeVoiceState(None)
+        await cog.on_voice_state_update(member, before, member.voice)
+    while cog.players:
+        await asyncio.sleep(0.001)
+    return {"cleanup_seconds": time.perf_counter() - started}
+
+
+async def run_once(guild_count, args):
+    loop = asyncio.get_running_loop()
+    bot = FakeBot(loop)
+    guilds = [FakeGuild() for _ in range(guild_count)]
+    for guild in guilds:
+        bot.add_guild(guild)
+
+    cog = make_cog(bot, args)
+    await cog.cog_load()
+    lag = LagSampler()
+    lag.start()
+
+    results = {}
+    try:
+        results.update(await bench_enqueue(cog, guilds, args.songs))
+        results.update(await bench_playback(cog, guilds, args.songs))
+        results.update(await bench_controls(cog, guilds, args.rounds))
+        results.update(await bench_cleanup(cog, guilds))
+    finally:
+        lag.stop()
+        await cog.cog_unload()
+
+    results["loop_lag_p99"] = percentile(lag.samples, 0.99)
+    results["resolver_cache"] = cog.resolver_cache.stats()["hit_rate"]
+    return results
+
+
+def compare(results, baselines, threshold):
+    regressions = []
+    for key, metrics in results.items():
+        baseline = baselines.get(key)
+        if not baseline:
+            continue
+        for name, higher_is_better in METRICS.items():
+            old, new = baseline.get(name), metrics.get(name)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (higher_is_better and change < -threshold) or (
+                not higher_is_better and change > threshold
+            ):
+                regressions.append(f"{key} {name}: {old:.4g} -> {new:.4g} ({change:+.0%})")
+    return regressions
+
+
+def print_results(key, metrics):
+    print(f"== {key}")
+    for name, value in metrics.items():
+        print(f"  {name:>18}: {value:.6g}")
+
+
+async def main(args):
+    results = {}
+    deadline = time.monotonic() + args.soak if args.soak else None
+    while True:
+        for guild_count in args.guilds:
+            key = f"guilds={guild_count}"
+            results[key] = await run_once(guild_count, args)
+            print_results(key, results[key])
+        if deadline is None or time.monotonic() >= deadline:
+            break
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline Music cog benchmark")
+    parser.add_argument(
+        "--guilds",
+        type=lambda value: [int(item) for item in value.split(",")],
+        default=[1, 100, 1000],
+        help="comma separated guild counts (1-5000)",
+    )
+    parser.add_argument("--songs", type=int, default=3, help="songs per guild")
+    parser.add_argument("--frames", type=int, default=50, help="20 ms frames per song")
+    parser.add_argument("--latency", type=float, default=0.02, help="fake extract latency")
+    parser.add_argument("--rounds", type=int, default=5, help="control button rounds")
+    parser.add_argument("--soak", type=float, default=0, help="repeat for N seconds")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    results = asyncio.run(main(args))
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+        sys.exit(0)
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions against baseline")
@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import os
+import re
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+from config.settings import settings
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    handlers=[logging.StreamHandler()],
+)
+logger = logging.getLogger("cluster")
+
+_SAMPLE = re.compile(r"^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})?(\s.*)$")
+
+
+async def recommended_shards():
+    async with aiohttp.ClientSession() as session:
+        async with session.get(
+            "https://discord.com/api/v10/gateway/bot",
+            headers={"Authorization": f"Bot {settings.TOKEN}"},
+        ) as response:
+            response.raise_for_status()
+            data = await response.json()
+    return data["shards"]
+
+
+def place_shards(shard_count, cluster_count):
+    # แบ่ง shard เป็นช่วงต่อเนื่องให้แต่ละ cluster เท่าๆ กัน
+    clusters = []
+    for cluster_id in range(cluster_count):
+        start = cluster_id * shard_count // cluster_count
+        end = (cluster_id + 1) * shard_count // cluster_count
+        clusters.append(list(range(start, end)))
+    return clusters
+
+
+def relabel(text, cluster_id, seen):
+    lines = []
+    for line in text.splitlines():
+        if line.startswith("#"):
+            if line not in seen:
+                seen.add(line)
+                lines.append(line)
+            continue
+        match = _SAMPLE.match(line)
+        if not match:
+            continue
+        name, labels, rest = match.groups()
+        inner = f'cluster="{cluster_id}"'
+        if labels and labels != "{}":
+            inner += "," + labels[1:-1]
+        lines.append(f"{name}{{{inner}}}{rest}")
+    return lines
+
+
+class Worker:
+    def __init__(self, cluster_id, cluster_count, shard_ids, shard_count):
+        self.cluster_id = cluster_id
+        self.cluster_count = cluster_count
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.port = settings.CLUSTER_PORT_BASE + cluster_id
+        self.process = None
+        self.restarts = 0
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.returncode is None
+
+    def environment(self):
+        env = dict(os.environ)
+        env.update(
+            {
+                "SHARDING": "1",
+                "CLUSTER_ID": str(self.cluster_id),
+                "CLUSTER_COUNT": str(self.cluster_count),
+                "SHARD_COUNT": str(self.shard_count),
+                "SHARD_IDS": ",".join(map(str, self.shard_ids)),
+                "WEB_HOST": "127.0.0.1",
+                "WEB_PORT": str(self.port),
+            }
+        )
+        # แต่ละ process ใช้ไฟล์ state ของตัวเอง เพราะ guild ไม่ย้าย cluster
+        if settings.STORE_PATH:
+            root, ext = os.path.splitext(settings.STORE_PATH)
+            env["STORE_PATH"] = f"{root}-{self.cluster_id}{ext}"
+        # audio cache ก็แยกโฟลเดอร์ และแบ่งขนาดรวมให้ทุก cluster ไม่เกินค่าที่ตั้งไว้
+        if settings.AUDIO_CACHE_DIR:
+            env["AUDIO_CACHE_DIR"] = os.path.join(
+                settings.AUDIO_CACHE_DIR, f"cluster-{self.cluster_id}"
+            )
+            env["AUDIO_CACHE_MAX_MB"] = str(
+                max(1, settings.AUDIO_CACHE_MAX_MB // self.cluster_count)
+            )
+        return env
+
+    async def run(self):
+        main = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+        failures = 0
+        while True:
+            logger.info(f"Starting cluster {self.cluster_id} with shards {self.shard_ids}")
+            started = time.monotonic()
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, main, env=self.environment()
+            )
+            code = await self.process.wait()
+            self.restarts += 1
+            if time.monotonic() - started > 300:
+                failures = 0
+            failures += 1
+            delay = min(60, 2 ** min(failures, 6))
+            logger.warning(
+                f"Cluster {self.cluster_id} exited with {code}, restarting in {delay}s"
+            )
+            await asyncio.sleep(delay)
+
+    def stop(self):
+        if self.alive:
+            self.process.terminate()
+
+
+class Supervisor:
+    def __init__(self, workers):
+        self.workers = workers
+        self.session = None
+
+    async def fetch(self, worker, path):
+        try:
+            async with self.session.get(
+                f"http://127.0.0.1:{worker.port}{path}",
+                timeout=aiohttp.ClientTimeout(total=5),
+            ) as response:
+                if path == "/metrics":
+                    return await response.text()
+                return await response.json()
+        except Exception as e:
+            logger.debug(f"Cluster {worker.cluster_id} {path} failed: {e}")
+            return None
+
+    async def handle_ping(self, request):
+        return web.Response(text="Bot is alive!")
+
+    async def handle_health(self, request):
+        results = await asyncio.gather(
+            *(self.fetch(worker, "/health") for worker in self.workers)
+        )
+        clusters = []
+        for worker, health in zip(self.workers, results):
+            clusters.append(
+                {
+                    "cluster": worker.cluster_id,
+                    "shards": worker.shard_ids,
+                    "alive": worker.alive,
+                    "restarts": worker.restarts,
+                    "health": health,
+                }
+            )
+        healthy = all(c["alive"] and c["health"] for c in clusters)
+        return web.json_response(
+            {"healthy": healthy, "clusters": clusters}, status=200 if healthy else 503
+        )
+
+    async def handle_metrics(self, request):
+        results = await asyncio.gather(
+            *(self.fetch(worker, "/metrics") for worker in self.workers)
+        )
+        seen = set()
+        lines = []
+        for worker, text in zip(self.workers, results):
+            if text:
+                lines.extend(relabel(text, worker.cluster_id, seen))
+        lines.append("# TYPE music_cluster_up gauge")
+        for worker, text in zip(self.workers, results):
+            lines.append(
+                f'music_cluster_up{{cluster="{worker.cluster_id}"}} {int(text is not None)}'
+            )
+        return web.Response(
+            text="\n".join(lines) + "\n", content_type="text/plain", charset="utf-8"
+        )
+
+    async def handle_debug_players(self, request):
+        results = await asyncio.gather(
+            *(self.fetch(worker, "/debug/players") for worker in self.workers)
+        )
+        players = []
+        for worker, items in zip(self.workers, results):
+            for item in items or ():
+                item["cluster"] = worker.cluster_id
+                players.append(item)
+        return web.json_response(players)
+
+    async def start(self):
+        self.session = aiohttp.ClientSession()
+        app = web.Application()
+        app.add_routes(
+            [
+                web.get("/", self.handle_ping),
+                web.get("/health", self.handle_health),
+                web.get("/metrics", self.handle_metrics),
+                web.get("/debug/players", self.handle_debug_players),
+            ]
+        )
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, settings.WEB_HOST, settings.WEB_PORT)
+        await site.start()
+        logger.info(f"Supervisor web server started on port {settings.WEB_PORT}")
+
+
+async def main():
+    shard_count = settings.SHARD_COUNT or await recommended_shards()
+    cluster_count = max(1, min(settings.CLUSTER_COUNT, shard_count))
+    placement = place_shards(shard_count, cluster_count)
+    workers = [
+        Worker(cluster_id, cluster_count, shard_ids, shard_count)
+        for cluster_id, shard_ids in enumerate(placement)
+    ]
+    logger.info(f"Launching {cluster_count} clusters for {shard_count} shards")
+
+    supervisor = Supervisor(workers)
+    await supervisor.start()
+    try:
+        await asyncio.gather(*(worker.run() for worker in workers))
+    finally:
+        for worker in workers:
+            worker.stop()
+        await supervisor.session.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Cluster stopped manually")
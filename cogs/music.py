@@ -3,11 +3,39 @@ from discord.ext import commands, tasks
 from discord import app_commands
 from discord.ui import View, Button, Select
 import asyncio
+import itertools
 import logging
-import yt_dlp
-from collections import deque
-import random
+import threading
 import time
+from config.settings import settings
+from utils import metrics
+from utils.audio_cache import AudioCache
+from utils.audio_node import AudioNodePool
+from utils.dsp import (
+    AVAILABLE as DSP_AVAILABLE,
+    EQ_PRESETS,
+    DSPChain,
+    DSPSource,
+    LoudnessCache,
+)
+from utils.embed_scheduler import EmbedScheduler
+from utils.ffmpeg import DecoderBusy, DecoderSlots, FFmpegSupervisor
+from utils.idle import IdleTimers
+from utils.mixer import MixerSource
+from utils.prefetch import Prefetcher
+from utils.resolver import ResolverBusy, ResolverScheduler
+from utils.resolver_cache import ResolverCache, youtube_playlist_id, youtube_video_id
+from utils.search import SearchCache, TitleIndex
+from utils.store import QueueStore, StateBatch
+from utils.track import Track
+from utils.track_queue import (
+    AlreadyQueued,
+    QueueFull,
+    TrackCounter,
+    TrackHistory,
+    TrackQueue,
+)
+from utils.ytdl import YDLPool
 
 logger = logging.getLogger("music")
 
@@ -16,21 +44,94 @@ FFMPEG_OPTIONS = {
     "options": "-vn",
 }
 
+OPUS_PASSTHROUGH_CODECS = ("opus",)
+
+YDL_OPTIONS = {
+    "format": "bestaudio[acodec=opus]/bestaudio",
+    "quiet": True,
+    "default_search": "ytsearch",
+    "noplaylist": True,
+    "extract_flat": False,
+    "source_address": "0.0.0.0",
+}
+
+PLAYLIST_OPTIONS = {
+    "quiet": True,
+    "noplaylist": False,
+    "extract_flat": "in_playlist",
+    "lazy_playlist": True,
+    "source_address": "0.0.0.0",
+}
+
+SEARCH_OPTIONS = {
+    "quiet": True,
+    "extract_flat": True,
+    "source_address": "0.0.0.0",
+}
+
+SEARCH_FIELDS = ("id", "url", "title", "duration", "uploader", "channel", "view_count")
+
+TRACK_FIELDS = (
+    "id",
+    "title",
+    "url",
+    "webpage_url",
+    "duration",
+    "thumbnail",
+    "uploader",
+    "view_count",
+    "acodec",
+    "asr",
+)
+
 
 class MusicPlayer:
-    def __init__(self):
-        self.queue = deque()
-        self.history = deque()
+    __slots__ = (
+        "guild_id",
+        "queue",
+        "history",
+        "current",
+        "voice_client",
+        "channel",
+        "message",
+        "view",
+        "volume",
+        "loop",
+        "shuffle",
+        "start_time",
+        "next_committed",
+        "prefetcher",
+        "track_ended_at",
+        "last_gap",
+        "mixer",
+        "up_next",
+        "dsp",
+        "eq",
+        "starting",
+    )
+
+    def __init__(self, guild_id=None, counter=None):
+        self.guild_id = guild_id
+        self.queue = TrackQueue(counter=counter)
+        self.history = TrackHistory(settings.HISTORY_SIZE, counter)
         self.current = None
         self.voice_client = None
         self.channel = None
         self.message = None
-        self.requester = None
+        self.view = None
         self.volume = 1.0
-        self.paused = False
         self.loop = False
         self.shuffle = False
         self.start_time = None
+        self.next_committed = False
+        self.prefetcher = None
+        self.track_ended_at = None
+        self.last_gap = None
+        self.mixer = None
+        self.up_next = None
+        self.dsp = None
+        self.starting = False
+        self.eq = "flat"
 
 
 class Music(commands.Cog):
@@ -38,30 +139,691 @@ class Music(commands.Cog):
         self.bot = bot
         self.music_channels = {}
         self.players = {}
-        self.auto_cleanup.start()
-
-    def get_audio_source(self, query: str):
-        ydl_opts = {
-            "format": "bestaudio",
-            "quiet": True,
-            "default_search": "ytsearch",
-            "noplaylist": True,
-            "extract_flat": False,
-            "source_address": "0.0.0.0",
+        # จำนวนเพลงในคิวและประวัติของทุก guild รวมกัน TrackQueue/TrackHistory อัปเดตให้เอง
+        self.held = TrackCounter()
+        self.resolver_cache = ResolverCache(
+            max_size=settings.RESOLVER_CACHE_SIZE,
+            default_ttl=settings.RESOLVER_CACHE_TTL,
+        )
+        self.ydl = YDLPool(YDL_OPTIONS, max_uses=settings.YDL_MAX_USES)
+        self.playlist_ydl = YDLPool(PLAYLIST_OPTIONS, max_uses=settings.YDL_MAX_USES)
+        self.search_ydl = YDLPool(SEARCH_OPTIONS, max_uses=settings.YDL_MAX_USES)
+        self.search_cache = SearchCache(settings.SEARCH_CACHE_SIZE, settings.SEARCH_CACHE_TTL)
+        self.titles = TitleIndex(settings.TITLE_INDEX_SIZE)
+        self.resolver = ResolverScheduler(
+            workers=settings.RESOLVER_WORKERS,
+            per_guild_limit=settings.RESOLVER_GUILD_INFLIGHT,
+            max_pending=settings.RESOLVER_GUILD_PENDING,
+        )
+        self.embeds = EmbedScheduler(
+            self.render_now_playing,
+            bucket_size=settings.EMBED_BUCKET_SIZE,
+            bucket_period=settings.EMBED_BUCKET_PERIOD,
+            global_rate=settings.EMBED_GLOBAL_RATE,
+        )
+        self.store = QueueStore(settings.STORE_PATH) if settings.STORE_PATH else None
+        self._dirty = set()
+        self._rooms_added = []
+        self._rooms_removed = []
+        self.ffmpeg = FFmpegSupervisor(
+            self.reopen_source,
+            DecoderSlots(settings.FFMPEG_SLOT_DIR, settings.FFMPEG_MAX_PROCESSES),
+            stall_seconds=settings.FFMPEG_STALL_SECONDS,
+            max_restarts=settings.FFMPEG_MAX_RESTARTS,
+            slot_wait=settings.FFMPEG_SLOT_WAIT,
+        )
+        self.nodes = (
+            AudioNodePool(
+                settings.AUDIO_NODES,
+                settings.AUDIO_NODE_DIR,
+                buffer=settings.AUDIO_NODE_BUFFER,
+                local=settings.AUDIO_NODE_LOCAL,
+                on_loudness=self.loudness_measured,
+            )
+            if settings.AUDIO_NODES > 0 or settings.AUDIO_NODE_LOCAL
+            else None
+        )
+        # mixer ต้องได้ PCM เพื่อผสมเสียง จึงปิด Opus passthrough
+        self.use_mixer = settings.PLAYBACK_ENGINE == "mixer"
+        if self.use_mixer and self.nodes is not None:
+            logger.warning("The mixer engine needs PCM in this process, using classic with audio nodes")
+            self.use_mixer = False
+        # audio node decode และ encode ใหม่เสมอ เพื่อให้ปรับเสียงระหว่างเล่นได้
+        self.passthrough = (
+            settings.OPUS_PASSTHROUGH and not self.use_mixer and self.nodes is None
+        )
+        self.dsp_enabled = settings.DSP_ENABLED and DSP_AVAILABLE
+        if settings.DSP_ENABLED and not DSP_AVAILABLE:
+            logger.warning("NumPy is not installed, volume and EQ are disabled")
+        self.loudness = (
+            LoudnessCache(
+                settings.LOUDNESS_CACHE_SIZE,
+                target=settings.LOUDNESS_TARGET,
+                max_boost=settings.LOUDNESS_MAX_BOOST,
+            )
+            if self.dsp_enabled and settings.LOUDNESS_NORMALIZE
+            else None
+        )
+        self.audio_cache = (
+            AudioCache(
+                settings.AUDIO_CACHE_DIR,
+                settings.AUDIO_CACHE_MAX_MB * 1024 * 1024,
+                min_plays=settings.AUDIO_CACHE_MIN_PLAYS,
+                max_duration=settings.AUDIO_CACHE_MAX_DURATION,
+                supervisor=self.ffmpeg,
+                on_loudness=(
+                    self.loudness_measured if self.loudness is not None else None
+                ),
+            )
+            if settings.AUDIO_CACHE_DIR
+            else None
+        )
+        self.idle = IdleTimers(self.on_idle)
+        self.room_activity = {}
+        self.voice_connects = asyncio.Semaphore(settings.VOICE_CONNECT_CONCURRENCY)
+        self.connecting = {}
+        self.prewarm_task = None
+
+    async def cog_load(self):
+        metrics.registry.collector(self.collect_metrics)
+        self.embeds.start()
+        self.idle.start()
+        self.ffmpeg.start()
+        if self.nodes is not None:
+            await self.nodes.start()
+        if self.audio_cache:
+            await asyncio.to_thread(self.audio_cache.load)
+            self.audio_cache.start()
+        if settings.EMBED_REFRESH_SECONDS > 0:
+            self.refresh_embeds.change_interval(seconds=settings.EMBED_REFRESH_SECONDS)
+            self.refresh_embeds.start()
+        if self.store:
+            await asyncio.to_thread(self.store.open)
+            if self.loudness is not None:
+                self.loudness.load(await asyncio.to_thread(self.store.load_loudness))
+            self.persist_state.change_interval(seconds=settings.STORE_FLUSH_SECONDS)
+            self.persist_state.start()
+            self.restore_task = asyncio.create_task(self.restore_state())
+
+    async def cog_unload(self):
+        metrics.registry.unregister_collector(self.collect_metrics)
+        self.idle.close()
+        if self.store:
+            self.persist_state.cancel()
+            # ตำแหน่งเพลงนับจากเฟรมของ source จึงต้องบันทึกก่อนปิด ffmpeg และ audio node
+            await self.flush_state()
+        self.ffmpeg.close()
+        if self.nodes is not None:
+            await self.nodes.close()
+        self.refresh_embeds.cancel()
+        self.embeds.close()
+        if self.audio_cache:
+            self.audio_cache.close()
+        if self.store:
+            await asyncio.to_thread(self.store.close)
+        self.resolver.shutdown()
+        self.ydl.close()
+        self.playlist_ydl.close()
+        self.search_ydl.close()
+
+    def resolve(self, query: str):
+        started = time.perf_counter()
+        info = self.ydl.extract_info(query)
+        metrics.RESOLVE_SECONDS.observe(time.perf_counter() - started)
+        if "entries" in info:
+            info = info["entries"][0]
+        # เก็บเฉพาะข้อมูลที่ใช้ ไม่เก็บ formats ทั้งหมดไว้ใน cache
+        info = {key: info.get(key) for key in TRACK_FIELDS}
+        return self.resolver_cache.put(query, info)
+
+    def search(self, query):
+        started = time.perf_counter()
+        info = self.search_ydl.extract_info(f"ytsearch{settings.SEARCH_RESULTS}:{query}")
+        metrics.SEARCH_SECONDS.observe(time.perf_counter() - started)
+        results = []
+        for entry in info.get("entries") or ():
+            if not entry or not entry.get("id"):
+                continue
+            result = {key: entry.get(key) for key in SEARCH_FIELDS}
+            # เก็บไว้แค่รูปเดียวพอ
+            thumbnails = entry.get("thumbnails")
+            result["thumbnails"] = thumbnails[-1:] if thumbnails else None
+            results.append(result)
+        return self.search_cache.put(query, results)
+
+    async def find(self, guild_id, query, owner=None):
+        results = self.search_cache.get(query)
+        if results is not None:
+            return results
+        return await self.resolver.submit(guild_id, self.search, query, owner=owner)
+
+    def iter_playlist(self, query, limit, emit, stop):
+        # ดึงรายการเพลงแบบ flat แล้วส่งเป็นชุดๆ กลับไปที่ event loop ทันทีที่ได้มา
+        info = self.playlist_ydl.extract_info(query, process=False)
+        if info.get("_type") in ("url", "url_transparent"):
+            info = self.playlist_ydl.extract_info(info["url"], process=False)
+
+        batch = []
+        count = 0
+        truncated = False
+        for entry in info.get("entries") or ():
+            if stop.is_set():
+                break
+            if not entry or not entry.get("id"):
+                continue
+            if count >= limit:
+                # เจอเพลงเกินจำนวนจริงๆ ไม่ใช่แค่ playlist ยาวพอดี limit
+                truncated = True
+                break
+            batch.append(entry)
+            count += 1
+            if count == 1 or len(batch) >= settings.PLAYLIST_BATCH_SIZE:
+                emit(batch)
+                batch = []
+        if batch:
+            emit(batch)
+        return info.get("title") or "Playlist", count, truncated
+
+    async def enqueue_playlist(self, message, player, loading_msg, url=None):
+        guild_id = message.guild.id
+        loop = asyncio.get_running_loop()
+        stop = threading.Event()
+        added = 0
+        started = False
+        self.make_room(player, settings.PLAYLIST_MAX_ENTRIES)
+        limit = min(settings.PLAYLIST_MAX_ENTRIES, self.queue_room(player))
+
+        def on_batch(entries):
+            nonlocal added, started
+            for entry in entries:
+                if settings.QUEUE_DEDUPE and player.queue.contains_video(entry["id"]):
+                    continue
+                player.queue.append(Track.from_flat(entry, message.author))
+                added += 1
+            if not started and player.voice_client and not self.is_busy(player):
+                started = True
+                asyncio.create_task(self.play_next(guild_id))
+            else:
+                self.on_queue_changed(player)
+
+        def emit(entries):
+            loop.call_soon_threadsafe(on_batch, entries)
+
+        task = asyncio.create_task(
+            self.resolver.submit(
+                guild_id,
+                self.iter_playlist,
+                url or message.content,
+                limit,
+                emit,
+                stop,
+                owner=message.channel.id,
+            )
+        )
+        try:
+            while not task.done():
+                await asyncio.wait({task}, timeout=2)
+                if task.done() or not added:
+                    continue
+                progress_embed = discord.Embed(
+                    title="📥 Loading Playlist...",
+                    description=f"Added **{added}** songs so far",
+                    color=0xFFFF00,
+                )
+                try:
+                    await loading_msg.edit(embed=progress_embed)
+                except:
+                    pass
+            title, count, truncated = task.result()
+        except BaseException:
+            stop.set()
+            task.cancel()
+            raise
+
+        description = f"**{title}**\n{added} songs added to the queue"
+        if count > added:
+            description += f" ({count - added} already queued)"
+        added_embed = discord.Embed(
+            title="✅ Playlist Added", description=description, color=0x00FF00
+        )
+        if truncated:
+            reason = "" if limit == settings.PLAYLIST_MAX_ENTRIES else "The queue is full. "
+            added_embed.set_footer(text=f"{reason}Only the first {limit} songs were added")
+        try:
+            await loading_msg.edit(embed=added_embed)
+            await loading_msg.delete(delay=3)
+        except:
+            pass
+
+    def split_queries(self, content):
+        # แยกทีละบรรทัด หรือด้วยตัวคั่นที่ตั้งไว้ถ้าเป็นข้อความบรรทัดเดียวที่ไม่ใช่ลิงก์
+        queries = [line.strip() for line in content.splitlines() if line.strip()]
+        separator = settings.MULTI_QUERY_SEPARATOR
+        if len(queries) == 1 and separator and "://" not in queries[0]:
+            queries = [part.strip() for part in queries[0].split(separator) if part.strip()]
+        return queries
+
+    async def enqueue_many(self, message, player, queries, loading_msg):
+        guild_id = message.guild.id
+        total = len(queries)
+        self.make_room(player, min(settings.MULTI_QUERY_MAX, total))
+        room = self.queue_room(player)
+        queries = queries[: min(settings.MULTI_QUERY_MAX, room)]
+        titles = list(queries)
+        marks = ["⏳"] * len(queries)
+        limit = asyncio.Semaphore(settings.MULTI_QUERY_CONCURRENCY)
+        added = 0
+        started = False
+
+        async def resolve(query):
+            async with limit:
+                return await self.lookup(guild_id, query, owner=message.channel.id)
+
+        def render(done):
+            lines = [
+                f"{mark} **{index}.** {title[:60]}"
+                for index, (mark, title) in enumerate(zip(marks, titles), start=1)
+            ]
+            if done:
+                embed = discord.Embed(
+                    title=f"✅ Added {added} of {len(queries)} songs",
+                    description="\n".join(lines),
+                    color=0x00FF00 if added else 0xFF0000,
+                )
+            else:
+                embed = discord.Embed(
+                    title=f"📥 Adding {len(queries)} songs...",
+                    description="\n".join(lines),
+                    color=0xFFFF00,
+                )
+            if total > len(queries):
+                reason = "The queue is full. " if room < settings.MULTI_QUERY_MAX else ""
+                embed.set_footer(text=f"{reason}Only the first {len(queries)} songs were added")
+            return embed
+
+        # resolve พร้อมกันแต่ใส่คิวตามลำดับที่พิมพ์มา
+        tasks = [asyncio.create_task(resolve(query)) for query in queries]
+        last_edit = 0.0
+        try:
+            for index, task in enumerate(tasks):
+                try:
+                    info = await task
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.info(f"Error loading {queries[index]!r}: {e}")
+                    metrics.RESOLVE_ERRORS.inc()
+                    marks[index] = "❌"
+                else:
+                    titles[index] = info.get("title") or queries[index]
+                    if settings.QUEUE_DEDUPE and player.queue.contains_video(info.get("id")):
+                        marks[index] = "ℹ️"
+                    else:
+                        player.queue.append(Track(queries[index], message.author, info))
+                        marks[index] = "✅"
+                        added += 1
+                        if (
+                            not started
+                            and player.voice_client
+                            and not self.is_busy(player)
+                        ):
+                            started = True
+                            asyncio.create_task(self.play_next(guild_id))
+                        else:
+                            self.on_queue_changed(player)
+
+                if time.monotonic() - last_edit >= 1.0:
+                    last_edit = time.monotonic()
+                    try:
+                        await loading_msg.edit(embed=render(False))
+                    except:
+                        pass
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        try:
+            await loading_msg.edit(embed=render(True))
+            # ลบทีหลังโดยไม่รอ กลุ่มถัดไปในข้อความเดียวกันจะได้เริ่มทันที
+            await loading_msg.delete(delay=3)
+        except:
+            pass
+
+    async def lookup(self, guild_id, query, owner=None):
+        info = self.resolver_cache.get(query)
+        if info is not None:
+            return info
+        return await self.resolver.submit(guild_id, self.resolve, query, owner=owner)
+
+    def make_room(self, player, wanted):
+        """Drop old history so ``wanted`` more tracks fit the global budget."""
+        if settings.TRACK_BUDGET <= 0:
+            return 0
+        if settings.QUEUE_MAX_TRACKS > 0:
+            wanted = min(wanted, settings.QUEUE_MAX_TRACKS - len(player.queue))
+        short = wanted - (settings.TRACK_BUDGET - self.held.held)
+        if short <= 0:
+            return 0
+        # เกิดเฉพาะตอน budget ใกล้เต็ม ทิ้งเพลงเก่าสุดของ guild ที่เก็บประวัติไว้มากที่สุดก่อน
+        freed = 0
+        players = sorted(self.players.values(), key=lambda p: len(p.history), reverse=True)
+        for other in players:
+            while other.history and freed < short:
+                other.history.pop()
+                freed += 1
+            if freed >= short:
+                break
+        return freed
+
+    def queue_room(self, player):
+        """How many more tracks ``player`` may queue under both limits."""
+        room = float("inf")
+        if settings.QUEUE_MAX_TRACKS > 0:
+            room = settings.QUEUE_MAX_TRACKS - len(player.queue)
+        if settings.TRACK_BUDGET > 0:
+            room = min(room, settings.TRACK_BUDGET - self.held.held)
+        return max(0, room)
+
+    def duplicate_embed(self, title):
+        return discord.Embed(
+            title="ℹ️ Already in Queue",
+            description=f"**{title}** is already waiting in the queue",
+            color=0x00BFFF,
+        )
+
+    def queue_full_embed(self, player):
+        if settings.QUEUE_MAX_TRACKS > 0 and len(player.queue) >= settings.QUEUE_MAX_TRACKS:
+            description = f"This server's queue is limited to **{settings.QUEUE_MAX_TRACKS}** songs"
+        else:
+            description = "Too many songs are queued across all servers right now. Please try again later."
+        return discord.Embed(title="❌ Queue Full", description=description, color=0xFF0000)
+
+    async def connect_player(self, player, voice_channel, text_channel):
+        voice_client = player.voice_client
+        if voice_client is None or not voice_client.is_connected():
+            voice_client = voice_channel.guild.voice_client
+        if voice_client is not None and voice_client.is_connected():
+            metrics.VOICE_REUSED.inc()
+            if player.voice_client is not voice_client:
+                player.voice_client = voice_client
+                player.channel = text_channel
+            if voice_client.channel != voice_channel and not self.has_listeners(voice_client):
+                # ห้องเดิมไม่มีคนฟังแล้ว ย้ายไปห้องของคนที่ขอเพลงแทนการต่อใหม่
+                await voice_client.move_to(voice_channel)
+            return
+
+        # ข้อความที่มาพร้อมกันใน guild เดียวกันใช้การเชื่อมต่อเดียวกัน
+        guild_id = player.guild_id
+        task = self.connecting.get(guild_id)
+        if task is None:
+            task = asyncio.create_task(self.open_voice(voice_channel))
+            self.connecting[guild_id] = task
+            task.add_done_callback(lambda _: self.connecting.pop(guild_id, None))
+        player.voice_client = await asyncio.shield(task)
+        player.channel = text_channel
+
+    async def open_voice(self, voice_channel):
+        stale = voice_channel.guild.voice_client
+        if stale is not None:
+            # discord.py อาจกำลัง reconnect อยู่ รอให้เสร็จก่อนจะต่อใหม่เอง
+            if await self.wait_connected(stale):
+                return stale
+            try:
+                await stale.disconnect(force=True)
+            except:
+                pass
+        async with self.voice_connects:
+            started = time.perf_counter()
+            voice_client = await voice_channel.connect()
+            metrics.VOICE_CONNECT_SECONDS.observe(time.perf_counter() - started)
+        return voice_client
+
+    async def wait_connected(self, voice_client):
+        deadline = time.monotonic() + settings.VOICE_RECONNECT_WAIT
+        while not voice_client.is_connected():
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(0.1)
+        return True
+
+    async def enqueue_track(self, member, text_channel, track):
+        player = self.get_player(text_channel.guild.id)
+        self.make_room(player, 1)
+        if not self.queue_room(player):
+            raise QueueFull(self.queue_full_embed(player).description)
+        # ใช้เงื่อนไขเดียวกับ on_message และ playlist
+        if settings.QUEUE_DEDUPE and player.queue.contains_video(track.video_id):
+            raise AlreadyQueued(track.title)
+        await self.connect_player(player, member.voice.channel, text_channel)
+        player.queue.append(track)
+        if not self.is_busy(player):
+            await self.play_next(player.guild_id)
+        else:
+            self.on_queue_changed(player)
+        return player
+
+    def record_play(self, track):
+        metrics.TRACKS_STARTED.inc()
+        if self.audio_cache:
+            self.audio_cache.record_play(track)
+        self.titles.add(track.title, track.webpage_url)
+
+    def get_player(self, guild_id):
+        player = self.players.get(guild_id)
+        if not player:
+            player = MusicPlayer(guild_id, self.held)
+            player.prefetcher = Prefetcher(self, guild_id)
+            if self.dsp_enabled:
+                player.dsp = DSPChain()
+            self.players[guild_id] = player
+        else:
+            self.idle.cancel(("player", guild_id))
+        return player
+
+    def can_passthrough(self, track, transcode=False):
+        return (
+            self.passthrough
+            and not transcode
+            and track.acodec in OPUS_PASSTHROUGH_CODECS
+            and track.asr in (None, 48000)
+        )
+
+    def is_cached(self, track):
+        return self.audio_cache is not None and track.video_id in self.audio_cache
+
+    def node_request(self, guild_id, track, url, options, seek=0):
+        player = self.players.get(guild_id)
+        request = {
+            "url": url,
+            "before_options": options["before_options"],
+            "options": options["options"],
+            "video_id": track.video_id,
+            "duration": track.duration,
+            "seek": seek,
+            "dsp": self.dsp_enabled,
+            "volume": player.volume if player else 1.0,
+            "preset": player.eq if player else "flat",
         }
+        if self.loudness is not None and track.video_id:
+            request["loudness"] = {
+                "lufs": self.loudness.get(track.video_id),
+                "target": self.loudness.target,
+                "max_boost": self.loudness.max_boost,
+            }
+        return request
+
+    def loudness_measured(self, video_id, lufs):
+        if self.loudness is not None:
+            self.loudness.put(video_id, lufs)
+
+    def spawn_ffmpeg(self, track, transcode=False, seek=0, guild_id=None):
+        cached = self.audio_cache.get(track.video_id) if self.audio_cache else None
+        if cached:
+            # ไฟล์ในเครื่องเป็น Ogg/Opus อยู่แล้ว ไม่ต้องใช้ reconnect
+            url = cached
+            options = {"before_options": "", "options": "-vn"}
+        else:
+            url = track.url
+            options = dict(FFMPEG_OPTIONS)
+        if seek:
+            options["before_options"] = f"{options['before_options']} -ss {seek:.2f}".strip()
+        if self.nodes is not None:
+            # ให้ audio node เปิด ffmpeg, ทำ DSP และ encode Opus แทน process นี้
+            return self.nodes.open(self.node_request(guild_id, track, url, options, seek))
+        # ถ้าต้นฉบับเป็น Opus อยู่แล้ว ส่ง packet ต่อได้เลยโดยไม่ต้อง decode/encode ใหม่
+        if (cached and self.passthrough and not transcode) or (
+            not cached and self.can_passthrough(track, transcode)
+        ):
+            source = discord.FFmpegOpusAudio(url, codec="copy", **options)
+        else:
+            source = discord.FFmpegPCMAudio(url, **options)
+        return source
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(query, download=False)
-            if "entries" in info:
-                info = info["entries"][0]
-            title = info.get("title", "Unknown Title")
-            url = info["url"]
-            duration = info.get("duration", 0)
-            thumbnail = info.get("thumbnail")
-            uploader = info.get("uploader", "Unknown Artist")
-            view_count = info.get("view_count", 0)
-            source = discord.FFmpegPCMAudio(url, **FFMPEG_OPTIONS)
-            return source, title, duration, thumbnail, uploader, view_count
+    def build_source(self, track, transcode=False, seek=0, guild_id=None):
+        slot = self.ffmpeg.slots.try_acquire()
+        if slot is None:
+            raise DecoderBusy("Too many ffmpeg processes on this host")
+        try:
+            source = self.spawn_ffmpeg(track, transcode, seek, guild_id)
+        except Exception:
+            slot.release()
+            raise
+        return self.ffmpeg.supervise(source, track, guild_id, seek, slot, transcode)
+
+    async def open_source(self, guild_id, track, transcode=False, seek=0):
+        # รอ slot ของ ffmpeg สักพักเมื่อเครื่องนี้เปิด process เต็มจำนวนแล้ว
+        deadline = time.monotonic() + settings.FFMPEG_SLOT_WAIT
+        while True:
+            try:
+                return self.build_source(
+                    track, transcode=transcode, seek=seek, guild_id=guild_id
+                )
+            except DecoderBusy:
+                if time.monotonic() >= deadline:
+                    raise
+                await asyncio.sleep(0.25)
+
+    async def reopen_source(self, source):
+        track = source.track
+        if not self.is_cached(track):
+            # ลิงก์เดิมอาจใช้ไม่ได้แล้ว จึงไม่ใช้ค่าใน cache
+            self.resolver_cache.invalidate(track.video_id)
+            info = await self.lookup(source.guild_id, track.source_query)
+            track.update(info)
+        replacement = self.spawn_ffmpeg(
+            track, source.transcode, source.position, source.guild_id
+        )
+        if replacement.is_opus() != source.is_opus():
+            replacement.cleanup()
+            raise RuntimeError("stream codec changed")
+        return replacement
+
+    async def create_source(self, guild_id, track, seek=0, transcode=False):
+        source = track.take_source()
+        if source is not None:
+            if (
+                (self.is_cached(track) or not track.is_stale())
+                and not seek
+                and not (transcode and source.is_opus())
+            ):
+                return source
+            source.cleanup()
+        if self.is_cached(track):
+            return await self.open_source(guild_id, track, transcode, seek)
+        # ลิงก์ stream มีอายุจำกัด ถ้าหมดอายุแล้วให้ resolve ใหม่ก่อนเล่น
+        if track.is_stale():
+            info = await self.lookup(guild_id, track.source_query)
+            track.update(info)
+        if self.passthrough and not transcode and track.acodec in (None, "none"):
+            try:
+                track.acodec = await self.ffmpeg.probe_codec(track.url, guild_id)
+            except Exception as e:
+                logger.info(f"Codec probe failed for {track}: {e}")
+        return await self.open_source(guild_id, track, transcode, seek)
+
+    def track_stage(self, player, track, seek=0):
+        if player.dsp is None:
+            return None
+        return player.dsp.track_stage(track.video_id, self.loudness, track.duration, seek)
+
+    def dsp_source(self, player, track, source, seek=0):
+        if player.dsp is None or source.is_opus():
+            return source
+        stage = self.track_stage(player, track, seek) if track else None
+        return DSPSource(source, player.dsp, stage)
+
+    def needs_decode(self, player, track=None):
+        if self.nodes is not None or player.dsp is None:
+            return False
+        if not player.dsp.neutral:
+            return True
+        # volume/EQ ปกติแต่รู้ความดังของเพลงแล้ว ต้อง decode เพื่อปรับ gain
+        if self.loudness is None or track is None or not track.video_id:
+            return False
+        lufs = self.loudness.get(track.video_id)
+        return lufs is not None and abs(self.loudness.gain(lufs) - 1.0) > 0.01
+
+    def apply_dsp(self, player):
+        if player.dsp is None:
+            return
+        player.dsp.volume = player.volume
+        player.dsp.set_preset(player.eq)
+        self.mark_dirty(player.guild_id)
+        if self.nodes is not None:
+            self.ffmpeg.configure(player.guild_id, volume=player.volume, preset=player.eq)
+            return
+        voice_client = player.voice_client
+        source = voice_client.source if voice_client else None
+        if (
+            source is not None
+            and source.is_opus()
+            and self.needs_decode(player, player.current)
+        ):
+            asyncio.create_task(self.decode_current(player))
+
+    async def decode_current(self, player):
+        # Opus passthrough ไม่ผ่าน DSP จึงเปิดเพลงเดิมใหม่แบบ decode ต่อจากตำแหน่งเดิม
+        track = player.current
+        voice_client = player.voice_client
+        position = self.track_position(player)
+        try:
+            source = await self.create_source(
+                player.guild_id, track, seek=position, transcode=True
+            )
+        except Exception as e:
+            logger.warning(f"Error switching {track} to decoded playback: {e}")
+            return
+        old = voice_client.source if voice_client else None
+        if player.current is not track or old is None or not old.is_opus():
+            source.cleanup()
+            return
+        if not getattr(voice_client, "encoder", None):
+            # play() สร้าง encoder ให้เฉพาะ source ที่ไม่ใช่ Opus ถ้าเพลงแรกเป็น
+            # passthrough การเชื่อมต่อนี้จะยังไม่มี encoder ให้ PCM ที่สลับเข้าไป
+            voice_client.encoder = discord.opus.Encoder()
+        voice_client.source = self.dsp_source(player, track, source, position)
+        old.cleanup()
+
+    def track_position(self, player):
+        """Seconds played of the current track, not counting time spent paused."""
+        if player.current is None:
+            return 0
+        position = self.ffmpeg.position(player.guild_id, player.current)
+        if position is None and player.start_time:
+            # ไม่มี source ที่นับเฟรมได้ ใช้เวลาจริงตั้งแต่เริ่มเพลงแทน
+            position = time.time() - player.start_time
+        return position or 0
+
+    def on_track_end(self, guild_id, error, voice_client=None):
+        player = self.players.get(guild_id)
+        if player and voice_client is not None and player.voice_client is not voice_client:
+            # การเชื่อมต่อเก่าที่ถูกแทนที่แล้ว recover_voice เล่นต่อให้เอง
+            return
+        if player:
+            player.track_ended_at = time.perf_counter()
+        if error:
+            logger.warning(f"Player error in guild {guild_id}: {error}")
+        asyncio.run_coroutine_threadsafe(self.play_next(guild_id), self.bot.loop)
 
     def format_duration(self, seconds):
         if seconds is None:
@@ -88,56 +850,206 @@ class Music(commands.Cog):
         bar = "━" * filled + "◉" + "━" * (length - filled - 1)
         return bar[:length]
 
-    async def play_next(self, guild_id):
+    def pop_next_track(self, player):
+        if player.shuffle and not player.next_committed:
+            track = player.queue.pop_random()
+        else:
+            track = player.queue.popleft()
+        player.next_committed = False
+        player.prefetcher.check_head(player)
+        return track
+
+    def on_queue_changed(self, player):
+        self.mark_dirty(player.guild_id)
+        player.prefetcher.check_head(player)
+        if player.mixer is not None and player.up_next is None:
+            asyncio.create_task(self.prepare_next(player.guild_id))
+        elif len(player.queue) <= player.prefetcher.depth:
+            player.prefetcher.schedule()
+
+    def make_mixer(self, guild_id):
         player = self.players[guild_id]
 
+        def on_advance(track):
+            # ถูกเรียกจาก thread ของ voice player ตอนที่ mixer เปลี่ยนเพลงเอง
+            player.up_next = None
+            asyncio.run_coroutine_threadsafe(
+                self.mixer_advanced(mixer, guild_id, track), self.bot.loop
+            )
+
+        mixer = MixerSource(on_advance, crossfade=settings.CROSSFADE_SECONDS)
+        return mixer
+
+    def reclaim_next(self, player):
+        # คืนเพลงที่เตรียมไว้ใน mixer กลับไปที่หัวคิว
+        if player.mixer is not None:
+            player.mixer.clear_next()
+        track, player.up_next = player.up_next, None
+        if track is not None and track is not player.current:
+            player.queue.appendleft(track)
+            player.next_committed = True
+
+    async def prepare_next(self, guild_id):
+        player = self.players.get(guild_id)
+        mixer = player.mixer if player else None
+        while mixer is not None and player.mixer is mixer and player.up_next is None:
+            if player.loop and player.current:
+                track = player.current
+            elif player.queue:
+                track = self.pop_next_track(player)
+            else:
+                mixer.clear_next()
+                return
+            player.up_next = track
+            mixer.expect_next()
+            try:
+                source = await self.create_source(guild_id, track)
+            except Exception as e:
+                logger.warning(f"Error preparing {track}: {e}")
+                if player.up_next is track:
+                    player.up_next = None
+                if track is player.current:
+                    mixer.clear_next()
+                    return
+                continue
+            if player.mixer is not mixer or player.up_next is not track:
+                source.cleanup()
+                return
+            mixer.set_next(source, track, self.track_stage(player, track))
+            return
+
+    async def mixer_advanced(self, mixer, guild_id, track):
+        player = self.players.get(guild_id)
+        if player is None or player.mixer is not mixer:
+            return
+        if player.current:
+            player.history.appendleft(player.current)
+        player.current = track
+        player.start_time = time.time()
+        self.record_play(track)
+        self.mark_dirty(guild_id)
+        player.prefetcher.schedule()
+        await self.send_embed(player)
+        await self.prepare_next(guild_id)
+
+    def is_busy(self, player):
+        """Whether ``player`` is playing, paused or already starting a track."""
+        voice_client = player.voice_client
+        return player.starting or (
+            voice_client is not None
+            and (voice_client.is_playing() or voice_client.is_paused())
+        )
+
+    async def play_next(self, guild_id, seek=0):
+        player = self.players.get(guild_id)
+        if player is None or player.starting:
+            # กำลังเตรียมเพลงอยู่แล้ว (รอ lookup หรือ decoder slot) ไม่เริ่มซ้อน
+            return
+        player.starting = True
+        try:
+            await self.start_next(player, seek)
+        finally:
+            player.starting = False
+
+    async def start_next(self, player, seek=0):
+        guild_id = player.guild_id
+        if not player.voice_client:
+            return
+        if not player.voice_client.is_connected():
+            return
+        self.mark_dirty(guild_id)
+
+        if player.mixer is not None:
+            self.reclaim_next(player)
+            player.mixer = None
+
         if player.loop and player.current:
             player.queue.appendleft(player.current)
 
-        if player.queue:
-            if player.shuffle:
-                index = random.randint(0, len(player.queue) - 1)
-                track = player.queue[index]
-                player.queue.remove(track)
+        if player.current:
+            player.history.appendleft(player.current)
+            player.current = None
+
+        while player.queue:
+            track = self.pop_next_track(player)
+
+            try:
+                source = await self.create_source(
+                    guild_id, track, seek=seek, transcode=self.needs_decode(player, track)
+                )
+            except Exception as e:
+                logger.warning(f"Error preparing {track}: {e}")
+                seek = 0
+                continue
+
+            voice_client = player.voice_client
+            if (
+                voice_client is None
+                or not voice_client.is_connected()
+                or voice_client.is_playing()
+                or voice_client.is_paused()
+            ):
+                # voice หลุดหรือมีเพลงเล่นอยู่แล้วระหว่างรอ source คืนเพลงไว้หัวคิว
+                source.cleanup()
+                player.queue.appendleft(track)
+                return
+
+            player.current = track
+            player.start_time = time.time() - seek
+
+            if self.use_mixer:
+                # ให้ mixer เปลี่ยนเพลงเองโดยไม่ต้องหยุดและเริ่ม voice player ใหม่
+                player.mixer = self.make_mixer(guild_id)
+                player.mixer.start(source, track, self.track_stage(player, track, seek))
+                source = self.dsp_source(player, None, player.mixer)
             else:
-                track = player.queue.popleft()
-
-            if player.current:
-                player.history.appendleft(player.current)
-
-            source, title, duration, thumbnail, uploader, view_count, requester = track
-            player.current = (
-                source,
-                title,
-                duration,
-                thumbnail,
-                uploader,
-                view_count,
-                requester,
-            )
-            player.start_time = time.time()
-
-            player.voice_client.play(
-                source,
-                after=lambda e: asyncio.run_coroutine_threadsafe(
-                    self.play_next(guild_id), self.bot.loop
-                ),
+                source = self.dsp_source(player, track, source, seek)
+
+            voice_client.play(
+                source, after=lambda e: self.on_track_end(guild_id, e, voice_client)
             )
+            self.idle.cancel(("grace", guild_id))
+            self.record_play(track)
+            if player.track_ended_at is not None:
+                player.last_gap = time.perf_counter() - player.track_ended_at
+                player.track_ended_at = None
+                metrics.TRACK_GAP_SECONDS.observe(player.last_gap)
+                logger.debug(f"Track gap in guild {guild_id}: {player.last_gap:.3f}s")
+            player.prefetcher.schedule()
+            if player.channel:
+                self.touch_room(player.channel.id)
             await self.send_embed(player)
-        else:
-            if player.message:
-                try:
-                    await player.message.delete()
-                except:
-                    pass
-            player.current = None
-            await player.voice_client.disconnect()
-            player.voice_client = None
+            if player.mixer is not None:
+                await self.prepare_next(guild_id)
+            return
+
+        self.embeds.discard(guild_id)
+        if player.message:
+            try:
+                await player.message.delete()
+            except:
+                pass
+            player.message = None
+        self.ffmpeg.reap(guild_id)
+        if settings.VOICE_GRACE_SECONDS > 0:
+            # ค้าง voice ไว้ก่อน เพลงถัดไปจะได้ไม่ต้อง handshake ใหม่
+            self.idle.schedule(("grace", guild_id), settings.VOICE_GRACE_SECONDS)
+            return
+        await player.voice_client.disconnect()
+        player.voice_client = None
+        self.schedule_release(guild_id)
 
     async def send_embed(self, player):
-        source, title, duration, thumbnail, uploader, view_count, requester = (
-            player.current
-        )
+        self.embeds.request(player.guild_id, player)
+
+    def render_now_playing(self, player):
+        track = player.current
+        title = track.title
+        duration = track.duration
+        thumbnail = track.thumbnail
+        uploader = track.uploader
+        view_count = track.view_count
+        requester_id = track.requester_id
 
         # สร้าง embed หลักที่สวยงาม
         embed = discord.Embed(title="", description="", color=0x1DB954)
@@ -154,13 +1066,13 @@ class Music(commands.Cog):
         song_info += f"👨‍🎤 **Artist:** {uploader}\n"
         song_info += f"⏱️ **Duration:** {self.format_duration(duration)}\n"
         song_info += f"👁️ **Views:** {self.format_number(view_count)}\n"
-        song_info += f"🎧 **Requested by:** {requester.mention}\n"
+        song_info += f"🎧 **Requested by:** {f'<@{requester_id}>' if requester_id else 'Unknown'}\n"
 
         embed.add_field(name="🎶 Now Playing", value=song_info, inline=False)
 
         # Progress bar พร้อมเวลา
         if player.start_time and duration:
-            current_time = time.time() - player.start_time
+            current_time = self.track_position(player)
             progress_bar = self.get_progress_bar(current_time, duration)
             time_display = f"{self.format_duration(current_time)} / {self.format_duration(duration)}"
         else:
@@ -183,14 +1095,16 @@ class Music(commands.Cog):
         embed.add_field(name="⚙️ Player Status", value=queue_info, inline=True)
 
         # แสดงเพลงถัดไป
-        if player.queue:
-            next_track = player.queue[0]
+        next_track = player.up_next or (player.queue[0] if player.queue else None)
+        if next_track:
             next_title = (
-                next_track[1][:50] + "..." if len(next_track[1]) > 50 else next_track[1]
+                next_track.title[:50] + "..."
+                if len(next_track.title) > 50
+                else next_track.title
             )
             embed.add_field(
                 name="⏭️ Up Next",
-                value=f"**{next_title}**\nby {next_track[4]}",
+                value=f"**{next_title}**\nby {next_track.uploader}",
                 inline=True,
             )
         else:
@@ -205,15 +1119,11 @@ class Music(commands.Cog):
         embed.timestamp = discord.utils.utcnow()
 
         # สร้าง control buttons ที่สวยงาม
-        view = EnhancedControlButtons(self, player)
+        # ใช้ view เดิมซ้ำ ไม่ต้องสร้างปุ่มใหม่ทุกครั้งที่เปลี่ยนเพลง
+        if player.view is None:
+            player.view = EnhancedControlButtons(self, player)
 
-        if player.message:
-            try:
-                await player.message.edit(embed=embed, view=view)
-            except:
-                player.message = await player.channel.send(embed=embed, view=view)
-        else:
-            player.message = await player.channel.send(embed=embed, view=view)
+        return embed, player.view
 
     @app_commands.command(name="create_music_room", description="สร้างห้องเพลง")
     async def create_music_room(self, interaction: discord.Interaction):
@@ -241,6 +1151,8 @@ class Music(commands.Cog):
                 topic=f"🎵 Music Room {interaction.user.display_name}",
             )
             self.music_channels[channel.id] = channel
+            self._rooms_added.append((channel.id, interaction.guild.id))
+            self.touch_room(channel.id)
 
             # สร้าง embed แนะนำที่สวยงาม
             welcome_embed = discord.Embed(
@@ -328,6 +1240,110 @@ class Music(commands.Cog):
             except:
                 pass
 
+    @app_commands.command(name="search", description="ค้นหาเพลงแล้วเลือกจากรายการ")
+    @app_commands.describe(query="ชื่อเพลงหรือคำค้นหา")
+    async def search_song(self, interaction: discord.Interaction, query: str):
+        if interaction.channel_id not in self.music_channels:
+            await interaction.response.send_message(
+                "❌ Use this command in a music room", ephemeral=True
+            )
+            return
+        voice_state = interaction.user.voice
+        if not voice_state or not voice_state.channel:
+            await interaction.response.send_message(
+                "❌ Please join a voice channel first!", ephemeral=True
+            )
+            return
+        self.touch_room(interaction.channel_id)
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        try:
+            if youtube_video_id(query):
+                # เลือกมาจาก autocomplete ไม่ต้องค้นหาซ้ำ
+                info = await self.lookup(
+                    interaction.guild_id, query, owner=interaction.channel_id
+                )
+                track = Track(query, interaction.user, info)
+                await self.enqueue_track(interaction.user, interaction.channel, track)
+                await interaction.followup.send(
+                    embed=self.added_embed(track), ephemeral=True
+                )
+                return
+
+            results = await self.find(
+                interaction.guild_id, query, owner=interaction.channel_id
+            )
+        except asyncio.CancelledError:
+            return
+        except QueueFull as e:
+            full_embed = discord.Embed(
+                title="❌ Queue Full", description=str(e), color=0xFF0000
+            )
+            await interaction.followup.send(embed=full_embed, ephemeral=True)
+            return
+        except AlreadyQueued as e:
+            await interaction.followup.send(
+                embed=self.duplicate_embed(str(e)), ephemeral=True
+            )
+            return
+        except Exception as e:
+            logger.warning(f"Error searching {query}: {e}")
+            metrics.RESOLVE_ERRORS.inc()
+            if isinstance(e, ResolverBusy):
+                description = "Too many songs are being searched in this server. Please wait a moment."
+            else:
+                description = "Could not search right now. Please try again."
+            error_embed = discord.Embed(
+                title="❌ Error", description=description, color=0xFF0000
+            )
+            await interaction.followup.send(embed=error_embed, ephemeral=True)
+            return
+
+        if not results:
+            empty_embed = discord.Embed(
+                title="🔍 No Results",
+                description=f"Nothing found for **{query}**",
+                color=0xFF0000,
+            )
+            await interaction.followup.send(embed=empty_embed, ephemeral=True)
+            return
+
+        embed = discord.Embed(
+            title="🔍 Search Results",
+            description="\n".join(
+                f"**{index + 1}.** {entry.get('title') or 'Unknown'}"
+                f" `{self.format_duration(entry.get('duration'))}`"
+                for index, entry in enumerate(results)
+            ),
+            color=0x1DB954,
+        )
+        view = SearchPickerView(self, interaction.channel, results)
+        await interaction.followup.send(embed=embed, view=view, ephemeral=True)
+
+    @search_song.autocomplete("query")
+    async def search_autocomplete(self, interaction: discord.Interaction, current: str):
+        # Discord จำกัดชื่อและค่าของตัวเลือกไว้ที่ 100 ตัวอักษร
+        return [
+            app_commands.Choice(name=title[:100], value=url)
+            for title, url in self.titles.complete(current)
+            if len(url) <= 100
+        ]
+
+    def added_embed(self, track, position=None):
+        embed = discord.Embed(
+            title="✅ Added to Queue",
+            description=f"**{track.title}**\nby {track.uploader}",
+            color=0x00FF00,
+        )
+        if track.thumbnail:
+            embed.set_thumbnail(url=track.thumbnail)
+        if position is not None:
+            embed.add_field(name="Position in Queue", value=f"#{position}", inline=True)
+        embed.add_field(
+            name="Duration", value=self.format_duration(track.duration), inline=True
+        )
+        return embed
+
     @commands.Cog.listener()
     async def on_message(self, message):
         if message.author.bot:
@@ -335,6 +1351,8 @@ class Music(commands.Cog):
 
         if message.channel.id not in self.music_channels:
             return
+        metrics.MESSAGES.inc()
+        self.touch_room(message.channel.id)
 
         try:
             await message.delete()
@@ -342,10 +1360,7 @@ class Music(commands.Cog):
             pass
 
         guild = message.guild
-        player = self.players.get(guild.id)
-        if not player:
-            player = MusicPlayer()
-            self.players[guild.id] = player
+        player = self.get_player(guild.id)
 
         voice_state = message.author.voice
         if not voice_state or not voice_state.channel:
@@ -362,10 +1377,17 @@ class Music(commands.Cog):
                 pass
             return
 
-        if not player.voice_client:
-            vc = await voice_state.channel.connect()
-            player.voice_client = vc
-            player.channel = message.channel
+        self.make_room(player, 1)
+        if not self.queue_room(player):
+            full_msg = await message.channel.send(embed=self.queue_full_embed(player))
+            await asyncio.sleep(3)
+            try:
+                await full_msg.delete()
+            except:
+                pass
+            return
+
+        await self.connect_player(player, voice_state.channel, message.channel)
 
         # แสดง loading message
         loading_embed = discord.Embed(
@@ -373,29 +1395,57 @@ class Music(commands.Cog):
             description=f"Looking for: **{message.content}**",
             color=0xFFFF00,
         )
+        if self.resolver.saturated:
+            loading_embed.set_footer(
+                text=f"⏳ Busy right now, {self.resolver.pending_count()} searches ahead of you"
+            )
         loading_msg = await message.channel.send(embed=loading_embed)
 
         try:
-            source, title, duration, thumb, uploader, view_count = (
-                await asyncio.to_thread(self.get_audio_source, message.content)
-            )
-            player.queue.append(
-                (source, title, duration, thumb, uploader, view_count, message.author)
+            queries = self.split_queries(message.content)
+            if len(queries) > 1:
+                # ลิงก์ playlist ต้องโหลดทั้ง playlist ส่วนที่เหลือ resolve พร้อมกันเป็นชุด
+                # ทำทีละกลุ่มตามลำดับที่พิมพ์มา
+                groups = itertools.groupby(
+                    queries, key=lambda query: bool(youtube_playlist_id(query))
+                )
+                for index, (is_playlist, group) in enumerate(groups):
+                    if index:
+                        loading_msg = await message.channel.send(embed=loading_embed)
+                    group = list(group)
+                    if not is_playlist:
+                        await self.enqueue_many(message, player, group, loading_msg)
+                        continue
+                    for position, url in enumerate(group):
+                        if position:
+                            loading_msg = await message.channel.send(embed=loading_embed)
+                        await self.enqueue_playlist(message, player, loading_msg, url)
+                return
+
+            if youtube_playlist_id(message.content):
+                await self.enqueue_playlist(message, player, loading_msg)
+                return
+
+            info = await self.lookup(
+                guild.id, message.content, owner=message.channel.id
             )
+            if settings.QUEUE_DEDUPE and player.queue.contains_video(info.get("id")):
+                try:
+                    await loading_msg.edit(embed=self.duplicate_embed(info.get("title")))
+                    await asyncio.sleep(3)
+                    await loading_msg.delete()
+                except:
+                    pass
+                return
+            track = Track(message.content, message.author, info)
+            player.queue.append(track)
+            self.on_queue_changed(player)
 
             # แสดง added to queue message
-            added_embed = discord.Embed(
-                title="✅ Added to Queue",
-                description=f"**{title}**\nby {uploader}",
-                color=0x00FF00,
-            )
-            added_embed.set_thumbnail(url=thumb)
-            added_embed.add_field(
-                name="Position in Queue", value=f"#{len(player.queue)}", inline=True
-            )
-            added_embed.add_field(
-                name="Duration", value=self.format_duration(duration), inline=True
-            )
+            added_embed = self.added_embed(track, len(player.queue))
+            if not self.is_busy(player):
+                # เริ่มเล่นก่อน ไม่ต้องรอข้อความ added หายไป
+                await self.play_next(guild.id)
 
             try:
                 await loading_msg.edit(embed=added_embed)
@@ -404,12 +1454,18 @@ class Music(commands.Cog):
             except:
                 pass
 
+        except asyncio.CancelledError:
+            return
+
         except Exception as e:
             logger.warning(f"Error loading audio: {e}")
+            metrics.RESOLVE_ERRORS.inc()
+            if isinstance(e, ResolverBusy):
+                description = "Too many songs are being searched in this server. Please wait a moment."
+            else:
+                description = "Could not load the song. Please try again with a different query."
             error_embed = discord.Embed(
-                title="❌ Error",
-                description="Could not load the song. Please try again with a different query.",
-                color=0xFF0000,
+                title="❌ Error", description=description, color=0xFF0000
             )
             try:
                 await loading_msg.edit(embed=error_embed)
@@ -419,21 +1475,452 @@ class Music(commands.Cog):
                 pass
             return
 
-        if not player.voice_client.is_playing():
-            await self.play_next(guild.id)
+    @commands.Cog.listener()
+    async def on_guild_channel_delete(self, channel):
+        if channel.id in self.music_channels:
+            del self.music_channels[channel.id]
+            self._rooms_removed.append(channel.id)
+            self.idle.cancel(("room", channel.id))
+            self.room_activity.pop(channel.id, None)
+            self.resolver.cancel(guild_id=channel.guild.id, owner=channel.id)
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member, before, after):
+        if before.channel == after.channel:
+            return
+        guild_id = member.guild.id
+        if guild_id not in self.players:
+            return
+        if member == self.bot.user and after.channel is None:
+            # ถูกเตะออกหรือหลุดจาก voice
+            self.idle.cancel(("voice", guild_id))
+            self.idle.cancel(("grace", guild_id))
+            self.schedule_release(guild_id)
+            return
+        # รวมถึงกรณีบอทถูกย้ายห้อง voice client จะตามไปเอง แค่ตรวจคนฟังในห้องใหม่
+        self.check_voice(guild_id)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # โหลด yt-dlp หลังต่อ gateway แล้ว ไม่ให้การ import ที่ช้าถ่วงการเริ่มบอท
+        if settings.YDL_PREWARM and self.prewarm_task is None:
+            self.prewarm_task = asyncio.create_task(self.prewarm_ytdl())
+
+    async def prewarm_ytdl(self):
+        started = time.perf_counter()
+        try:
+            await asyncio.to_thread(self.ydl.prewarm)
+        except Exception as e:
+            logger.warning(f"Could not prewarm yt-dlp: {e}")
+            return
+        startup = getattr(self.bot, "startup", None)
+        if startup is not None:
+            startup.record("yt_dlp_prewarm", time.perf_counter() - started)
+
+    @commands.Cog.listener()
+    async def on_resumed(self):
+        # หลัง gateway resume บาง voice อาจหลุด ต่อใหม่ผ่าน voice_connects ทีละไม่กี่ห้อง
+        guild_ids = [
+            guild_id
+            for guild_id, player in self.players.items()
+            if player.voice_client is not None and not player.voice_client.is_connected()
+        ]
+        if guild_ids:
+            logger.info(f"Checking {len(guild_ids)} voice connections after resume")
+            await asyncio.gather(
+                *(self.recover_voice(guild_id) for guild_id in guild_ids),
+                return_exceptions=True,
+            )
+
+    async def recover_voice(self, guild_id):
+        player = self.players.get(guild_id)
+        voice_client = player.voice_client if player else None
+        if voice_client is None or await self.wait_connected(voice_client):
+            return
+        channel = voice_client.channel
+        position = self.track_position(player)
+        player.voice_client = None
+        try:
+            await voice_client.disconnect(force=True)
+        except:
+            pass
+        try:
+            player.voice_client = await self.open_voice(channel)
+        except Exception as e:
+            logger.warning(f"Could not reconnect voice in guild {guild_id}: {e}")
+            self.schedule_release(guild_id)
+            return
+        logger.info(f"Reconnected voice in guild {guild_id}")
+        if player.current:
+            # เล่นเพลงเดิมต่อจากตำแหน่งที่หลุดไป
+            player.queue.appendleft(player.current)
+            player.next_committed = True
+            player.current = None
+            await self.play_next(guild_id, seek=position)
+        elif settings.VOICE_GRACE_SECONDS > 0:
+            self.idle.schedule(("grace", guild_id), settings.VOICE_GRACE_SECONDS)
+
+    def touch_room(self, channel_id):
+        self.room_activity[channel_id] = time.monotonic()
+        key = ("room", channel_id)
+        if settings.ROOM_IDLE_SECONDS > 0 and key not in self.idle:
+            self.idle.schedule(key, settings.ROOM_IDLE_SECONDS)
+
+    def has_listeners(self, voice_client):
+        return voice_client.is_connected() and any(
+            not member.bot for member in voice_client.channel.members
+        )
+
+    def check_voice(self, guild_id):
+        player = self.players.get(guild_id)
+        voice_client = player.voice_client if player else None
+        key = ("voice", guild_id)
+        if voice_client is None or not voice_client.is_connected():
+            self.idle.cancel(key)
+        elif self.has_listeners(voice_client):
+            self.idle.cancel(key)
+        elif key not in self.idle:
+            self.idle.schedule(key, settings.VOICE_IDLE_SECONDS)
+
+    def schedule_release(self, guild_id):
+        self.idle.schedule(("player", guild_id), settings.PLAYER_IDLE_SECONDS)
+
+    async def on_idle(self, key):
+        kind, target = key
+        if kind == "voice":
+            player = self.players.get(target)
+            voice_client = player.voice_client if player else None
+            # ตรวจซ้ำอีกครั้ง เผื่อมีคนกลับเข้ามาโดยไม่มี event ยกเลิก timer
+            if voice_client is None or not self.has_listeners(voice_client):
+                await self.shutdown_player(target)
+        elif kind == "grace":
+            player = self.players.get(target)
+            if player is None or player.queue:
+                return
+            voice_client = player.voice_client
+            if voice_client is None or not (
+                voice_client.is_playing() or voice_client.is_paused()
+            ):
+                await self.shutdown_player(target)
+        elif kind == "player":
+            self.release_player(target)
+        elif kind == "room":
+            await self.expire_room(target)
+
+    async def shutdown_player(self, guild_id):
+        player = self.players.get(guild_id)
+        if player is None:
+            return
+        voice_client, player.voice_client = player.voice_client, None
+        self.embeds.discard(guild_id)
+        if player.message:
+            try:
+                await player.message.delete()
+            except:
+                pass
+            player.message = None
+        if voice_client is not None:
+            await voice_client.disconnect()
+        self.release_player(guild_id)
+        logger.info(f"Left idle voice channel in guild {guild_id}")
+
+    def release_player(self, guild_id):
+        player = self.players.get(guild_id)
+        if player is None:
+            return
+        if player.voice_client and player.voice_client.is_connected():
+            return
+        self.idle.cancel(("player", guild_id))
+        self.idle.cancel(("voice", guild_id))
+        self.idle.cancel(("grace", guild_id))
+        player.prefetcher.release(player)
+        self.ffmpeg.reap(guild_id)
+        self.embeds.discard(guild_id)
+        if player.view is not None:
+            # ปุ่ม Stop บังทับเมธอด stop ของ View
+            View.stop(player.view)
+        player.queue.clear()
+        player.history.clear()
+        del self.players[guild_id]
+        self.mark_dirty(guild_id)
+
+    async def expire_room(self, channel_id):
+        channel = self.music_channels.get(channel_id)
+        if channel is None:
+            return
+        remaining = settings.ROOM_IDLE_SECONDS - (
+            time.monotonic() - self.room_activity.get(channel_id, 0)
+        )
+        player = self.players.get(channel.guild.id)
+        if (
+            player
+            and player.channel
+            and player.channel.id == channel_id
+            and player.voice_client
+            and player.voice_client.is_connected()
+        ):
+            remaining = settings.ROOM_IDLE_SECONDS
+        if remaining > 0:
+            self.idle.schedule(("room", channel_id), remaining)
+            return
+        try:
+            await channel.delete()
+        except Exception as e:
+            logger.warning(f"Error deleting channel: {e}")
+            return
+        self.music_channels.pop(channel_id, None)
+        self.room_activity.pop(channel_id, None)
+        self._rooms_removed.append(channel_id)
+        logger.info(f"Deleted inactive music room: {channel.name}")
+
+    def live_ffmpeg_count(self):
+        return self.ffmpeg.live_count()
+
+    def collect_metrics(self):
+        stats = self.resolver_cache.stats()
+        yield (
+            "music_resolver_cache_hits_total",
+            "counter",
+            "Resolver cache hits",
+            [({}, stats["hits"])],
+        )
+        yield (
+            "music_resolver_cache_misses_total",
+            "counter",
+            "Resolver cache misses",
+            [({}, stats["misses"])],
+        )
+        yield (
+            "music_resolver_cache_entries",
+            "gauge",
+            "Entries in the resolver cache",
+            [({}, stats["size"])],
+        )
+        yield (
+            "music_search_cache_hits_total",
+            "counter",
+            "Flat search cache hits",
+            [({}, self.search_cache.hits)],
+        )
+        yield (
+            "music_search_cache_misses_total",
+            "counter",
+            "Flat search cache misses",
+            [({}, self.search_cache.misses)],
+        )
+        yield (
+            "music_title_index_entries",
+            "gauge",
+            "Titles in the autocomplete index",
+            [({}, len(self.titles))],
+        )
+        yield (
+            "music_tracks_held",
+            "gauge",
+            "Tracks held in queues and histories across all guilds",
+            [({}, self.held.held)],
+        )
+        yield (
+            "music_resolver_pending",
+            "gauge",
+            "Lookups waiting for a resolver worker",
+            [({}, self.resolver.pending_count())],
+        )
+        yield (
+            "music_resolver_running",
+            "gauge",
+            "Lookups running on resolver workers",
+            [({}, self.resolver.running)],
+        )
+        if self.audio_cache:
+            cache = self.audio_cache.stats()
+            yield (
+                "music_audio_cache_hits_total",
+                "counter",
+                "Tracks served from the local audio cache",
+                [({}, cache["hits"])],
+            )
+            yield (
+                "music_audio_cache_bytes",
+                "gauge",
+                "Bytes stored in the local audio cache",
+                [({}, cache["bytes"])],
+            )
+        yield (
+            "music_queue_depth",
+            "gauge",
+            "Queued tracks per guild",
+            [({"guild": gid}, len(p.queue)) for gid, p in self.players.items()],
+        )
+        yield (
+            "music_players",
+            "gauge",
+            "Guild players held in memory",
+            [({}, len(self.players))],
+        )
+        yield (
+            "music_voice_clients",
+            "gauge",
+            "Connected voice clients",
+            [({}, len(self.bot.voice_clients))],
+        )
+        yield (
+            "music_ffmpeg_processes",
+            "gauge",
+            "Live ffmpeg child processes",
+            [({}, self.live_ffmpeg_count())],
+        )
+        yield (
+            "music_ffmpeg_slots_held",
+            "gauge",
+            "Per-host ffmpeg slots held by this process",
+            [({}, self.ffmpeg.slots.held)],
+        )
+        if self.nodes is not None:
+            yield (
+                "music_audio_node_streams",
+                "gauge",
+                "Streams open on each audio node",
+                [({"node": str(index)}, count) for index, count in self.nodes.stats()],
+            )
+
+    def debug_players(self):
+        players = []
+        for guild_id, player in self.players.items():
+            voice_client = player.voice_client
+            players.append(
+                {
+                    "guild_id": guild_id,
+                    "current": player.current.title if player.current else None,
+                    "queue": len(player.queue),
+                    "history": len(player.history),
+                    "connected": bool(voice_client and voice_client.is_connected()),
+                    "playing": bool(voice_client and voice_client.is_playing()),
+                    "loop": player.loop,
+                    "shuffle": player.shuffle,
+                    "last_gap": player.last_gap,
+                    "dsp": player.dsp.stats() if player.dsp else None,
+                }
+            )
+        return players
+
+    def mark_dirty(self, guild_id):
+        if self.store:
+            self._dirty.add(guild_id)
+
+    def snapshot_player(self, player):
+        voice_client = player.voice_client
+        if voice_client is None or not voice_client.is_connected():
+            return None
+        return {
+            "text_channel_id": player.channel.id if player.channel else None,
+            "voice_channel_id": voice_client.channel.id,
+            "current": player.current.to_dict() if player.current else None,
+            "position": self.track_position(player),
+            "loop": player.loop,
+            "shuffle": player.shuffle,
+            "volume": player.volume,
+        }
 
-    @tasks.loop(minutes=1)
-    async def auto_cleanup(self):
-        for channel_id in list(self.music_channels):
+    async def flush_state(self):
+        # รวบรวมการเปลี่ยนแปลงทั้งหมดแล้วเขียนลง SQLite ครั้งเดียวนอก event loop
+        batch = StateBatch()
+        batch.rooms_added, self._rooms_added = self._rooms_added, []
+        batch.rooms_removed, self._rooms_removed = self._rooms_removed, []
+        dirty, self._dirty = self._dirty, set()
+        if self.loudness is not None:
+            batch.loudness = self.loudness.drain()
+        for guild_id in dirty:
+            player = self.players.get(guild_id)
+            row = self.snapshot_player(player) if player else None
+            batch.players[guild_id] = row
+            if row is not None:
+                tracks = list(player.queue)
+                if player.up_next and player.up_next is not player.current:
+                    tracks.insert(0, player.up_next)
+                batch.queues[guild_id] = [track.to_dict() for track in tracks]
+        for guild_id, player in self.players.items():
+            if guild_id not in dirty and player.current and player.start_time:
+                batch.positions.append((self.track_position(player), guild_id))
+        if batch:
+            try:
+                await asyncio.to_thread(self.store.write, batch)
+            except Exception as e:
+                logger.error(f"Error saving player state: {e}")
+                self._dirty |= dirty
+                self._rooms_added[:0] = batch.rooms_added
+                self._rooms_removed[:0] = batch.rooms_removed
+                if self.loudness is not None and batch.loudness:
+                    self.loudness.requeue(batch.loudness)
+
+    @tasks.loop(seconds=5)
+    async def persist_state(self):
+        await self.flush_state()
+
+    async def restore_state(self):
+        await self.bot.wait_until_ready()
+        rooms, players = await asyncio.to_thread(self.store.load)
+
+        for channel_id, guild_id in rooms:
             channel = self.bot.get_channel(channel_id)
-            if channel and isinstance(channel, discord.TextChannel):
-                if len(channel.members) == 0:
-                    try:
-                        await channel.delete()
-                        del self.music_channels[channel_id]
-                        logger.info(f"Deleted inactive music room: {channel.name}")
-                    except Exception as e:
-                        logger.warning(f"Error deleting channel: {e}")
+            if channel:
+                self.music_channels[channel_id] = channel
+                self.touch_room(channel_id)
+            else:
+                self._rooms_removed.append(channel_id)
+
+        limit = asyncio.Semaphore(settings.RESTORE_CONCURRENCY)
+
+        async def restore(guild_id, data):
+            async with limit:
+                try:
+                    await self.restore_player(guild_id, data)
+                except Exception as e:
+                    logger.warning(f"Could not restore player for guild {guild_id}: {e}")
+                    self.mark_dirty(guild_id)
+
+        await asyncio.gather(*(restore(gid, data) for gid, data in players.items()))
+        logger.info(f"Restored {len(self.music_channels)} rooms and {len(players)} players")
+
+    async def restore_player(self, guild_id, data):
+        guild = self.bot.get_guild(guild_id)
+        voice_channel = guild and guild.get_channel(data["voice_channel_id"])
+        text_channel = guild and guild.get_channel(data["text_channel_id"])
+        if not voice_channel or not text_channel or not (data["current"] or data["queue"]):
+            self.mark_dirty(guild_id)
+            return
+
+        player = self.get_player(guild_id)
+        player.channel = text_channel
+        player.loop = data["loop"]
+        player.shuffle = data["shuffle"]
+        player.volume = data["volume"]
+        self.apply_dsp(player)
+        player.queue.extend(
+            Track.from_dict(t, t.get("requester_id"))
+            for t in data["queue"][: settings.QUEUE_MAX_TRACKS or None]
+        )
+        seek = 0
+        if data["current"]:
+            current = data["current"]
+            player.queue.appendleft(Track.from_dict(current, current.get("requester_id")))
+            player.next_committed = True
+            seek = data["position"]
+
+        # ผ่าน voice_connects เหมือนการต่อปกติ ไม่ให้ restart ต่อ voice พร้อมกันทุก guild
+        await self.connect_player(player, voice_channel, text_channel)
+        await self.play_next(guild_id, seek=seek)
+
+    @tasks.loop(seconds=15)
+    async def refresh_embeds(self):
+        for player in self.players.values():
+            if (
+                player.current
+                and player.message
+                and player.voice_client
+                and player.voice_client.is_playing()
+            ):
+                self.embeds.request(player.guild_id, player)
 
 
 class EnhancedControlButtons(View):
@@ -444,12 +1931,18 @@ class EnhancedControlButtons(View):
 
     @discord.ui.button(emoji="⏹️", style=discord.ButtonStyle.danger, label="Stop")
     async def stop(self, interaction: discord.Interaction, button: Button):
+        self.player.prefetcher.release(self.player)
+        self.cog.embeds.discard(self.player.guild_id)
         await self.player.voice_client.disconnect()
+        self.cog.mark_dirty(self.player.guild_id)
+        self.cog.ffmpeg.reap(self.player.guild_id)
+        self.cog.schedule_release(self.player.guild_id)
         if self.player.message:
             try:
                 await self.player.message.delete()
             except:
                 pass
+            self.player.message = None
 
         embed = discord.Embed(
             title="⏹️ Music Stopped",
@@ -483,8 +1976,11 @@ class EnhancedControlButtons(View):
     @discord.ui.button(emoji="⏭️", style=discord.ButtonStyle.secondary, label="Skip")
     async def skip(self, interaction: discord.Interaction, button: Button):
         if self.player.current:
-            current_title = self.player.current[1]
-            self.player.voice_client.stop()
+            current_title = self.player.current.title
+            if self.player.mixer is not None:
+                self.player.mixer.skip()
+            else:
+                self.player.voice_client.stop()
             embed = discord.Embed(
                 title="⏭️ Song Skipped",
                 description=(
@@ -501,6 +1997,7 @@ class EnhancedControlButtons(View):
     )
     async def previous(self, interaction: discord.Interaction, button: Button):
         if self.player.history:
+            self.cog.reclaim_next(self.player)
             self.player.queue.appendleft(self.player.current)
             self.player.current = self.player.history.popleft()
             self.player.voice_client.stop()
@@ -514,6 +2011,7 @@ class EnhancedControlButtons(View):
     @discord.ui.button(emoji="🔀", style=discord.ButtonStyle.secondary, label="Shuffle")
     async def toggle_shuffle(self, interaction: discord.Interaction, button: Button):
         self.player.shuffle = not self.player.shuffle
+        self.cog.mark_dirty(self.player.guild_id)
         state = "Enabled" if self.player.shuffle else "Disabled"
         color = 0x00FF00 if self.player.shuffle else 0xFF0000
         embed = discord.Embed(
@@ -526,6 +2024,10 @@ class EnhancedControlButtons(View):
     @discord.ui.button(emoji="🔂", style=discord.ButtonStyle.secondary, label="Loop")
     async def toggle_loop(self, interaction: discord.Interaction, button: Button):
         self.player.loop = not self.player.loop
+        if self.player.mixer is not None:
+            # เพลงถัดไปที่เตรียมไว้ขึ้นกับโหมด loop จึงต้องเลือกใหม่
+            self.cog.reclaim_next(self.player)
+        self.cog.on_queue_changed(self.player)
         state = "Enabled" if self.player.loop else "Disabled"
         color = 0x00FF00 if self.player.loop else 0xFF0000
         embed = discord.Embed(
@@ -551,16 +2053,20 @@ class VolumeControlView(View):
         super().__init__(timeout=30)
         self.cog = cog
         self.player = player
+        if player.dsp is None:
+            self.remove_item(self.equalizer)
 
     @discord.ui.button(emoji="🔇", label="Mute", style=discord.ButtonStyle.danger)
     async def mute(self, interaction: discord.Interaction, button: Button):
         self.player.volume = 0.0
+        self.cog.apply_dsp(self.player)
         embed = discord.Embed(title="🔇 Muted", color=0xFF0000)
         await interaction.response.edit_message(embed=embed, view=self)
 
     @discord.ui.button(emoji="🔉", label="-10%", style=discord.ButtonStyle.secondary)
     async def volume_down(self, interaction: discord.Interaction, button: Button):
         self.player.volume = max(0.0, self.player.volume - 0.1)
+        self.cog.apply_dsp(self.player)
         embed = discord.Embed(
             title="🔊 Volume Control",
             description=f"Volume: **{int(self.player.volume * 100)}%**",
@@ -571,6 +2077,7 @@ class VolumeControlView(View):
     @discord.ui.button(emoji="🔊", label="+10%", style=discord.ButtonStyle.secondary)
     async def volume_up(self, interaction: discord.Interaction, button: Button):
         self.player.volume = min(2.0, self.player.volume + 0.1)
+        self.cog.apply_dsp(self.player)
         embed = discord.Embed(
             title="🔊 Volume Control",
             description=f"Volume: **{int(self.player.volume * 100)}%**",
@@ -581,11 +2088,104 @@ class VolumeControlView(View):
     @discord.ui.button(emoji="📢", label="Max", style=discord.ButtonStyle.success)
     async def max_volume(self, interaction: discord.Interaction, button: Button):
         self.player.volume = 1.0
+        self.cog.apply_dsp(self.player)
         embed = discord.Embed(
             title="📢 Max Volume", description="Volume: **100%**", color=0x00FF00
         )
         await interaction.response.edit_message(embed=embed, view=self)
 
+    @discord.ui.select(
+        placeholder="🎚️ Equalizer",
+        options=[
+            discord.SelectOption(label=name.replace("_", " ").title(), value=name)
+            for name in EQ_PRESETS
+        ],
+        row=1,
+    )
+    async def equalizer(self, interaction: discord.Interaction, select: Select):
+        self.player.eq = select.values[0]
+        self.cog.apply_dsp(self.player)
+        embed = discord.Embed(
+            title="🎚️ Equalizer",
+            description=f"Preset: **{self.player.eq.replace('_', ' ').title()}**",
+            color=0x1DB954,
+        )
+        await interaction.response.edit_message(embed=embed, view=self)
+
+
+class SearchPickerView(View):
+    def __init__(self, cog, channel, results):
+        super().__init__(timeout=60)
+        self.cog = cog
+        self.channel = channel
+        self.results = results
+        self.pick.options = [
+            discord.SelectOption(
+                label=(entry.get("title") or "Unknown")[:100],
+                description=(
+                    f"{entry.get('uploader') or entry.get('channel') or 'Unknown Artist'}"
+                    f" · {cog.format_duration(entry.get('duration'))}"
+                )[:100],
+                value=str(index),
+            )
+            for index, entry in enumerate(results)
+        ]
+
+    @discord.ui.select(placeholder="🎵 Choose a song")
+    async def pick(self, interaction: discord.Interaction, select: Select):
+        voice_state = interaction.user.voice
+        if not voice_state or not voice_state.channel:
+            await interaction.response.send_message(
+                "❌ Please join a voice channel first!", ephemeral=True
+            )
+            return
+        self.stop()
+        entry = self.results[int(select.values[0])]
+        # ยังไม่ resolve stream ตอนนี้ create_source จะ resolve เฉพาะเพลงที่เลือกตอนจะเล่น
+        track = Track.from_flat(entry, interaction.user)
+        loading_embed = discord.Embed(
+            title="⏳ Adding...", description=f"**{track.title}**", color=0xFFFF00
+        )
+        await interaction.response.edit_message(embed=loading_embed, view=None)
+        try:
+            player = await self.cog.enqueue_track(interaction.user, self.channel, track)
+        except QueueFull as e:
+            full_embed = discord.Embed(
+                title="❌ Queue Full", description=str(e), color=0xFF0000
+            )
+            try:
+                await interaction.edit_original_response(embed=full_embed)
+            except:
+                pass
+            return
+        except AlreadyQueued as e:
+            try:
+                await interaction.edit_original_response(
+                    embed=self.cog.duplicate_embed(str(e))
+                )
+            except:
+                pass
+            return
+        except Exception as e:
+            logger.warning(f"Error adding {track}: {e}")
+            error_embed = discord.Embed(
+                title="❌ Error",
+                description="Could not load the song. Please try again.",
+                color=0xFF0000,
+            )
+            try:
+                await interaction.edit_original_response(embed=error_embed)
+            except:
+                pass
+            return
+        position = len(player.queue) if player.queue else None
+        try:
+            await interaction.edit_original_response(
+                embed=self.cog.added_embed(track, position)
+            )
+        except:
+            pass
+
 
 async def setup(bot):
     await bot.add_cog(Music(bot))
@@ -8,5 +8,101 @@ class Settings:
     TOKEN = os.getenv("DISCORD_TOKEN")
     MUSIC_ROOM_PREFIX = "🎵"
 
+    # Lean mode ขอเฉพาะ intent ที่ระบบเพลงใช้ และไม่ cache สมาชิก/ข้อความ
+    LEAN_MODE = os.getenv("LEAN_MODE", "0") == "1"
+    MESSAGE_CACHE_SIZE = int(os.getenv("MESSAGE_CACHE_SIZE", "0"))
+
+    WEB_HOST = os.getenv("WEB_HOST", "0.0.0.0")
+    WEB_PORT = int(os.getenv("WEB_PORT", "8080"))
+
+    # SHARD_COUNT ว่าง = ให้ Discord แนะนำจำนวน shard เอง
+    SHARDING = os.getenv("SHARDING", "0") == "1"
+    SHARD_COUNT = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None
+    SHARD_IDS = (
+        [int(shard) for shard in os.getenv("SHARD_IDS").split(",")]
+        if os.getenv("SHARD_IDS")
+        else None
+    )
+    CLUSTER_COUNT = int(os.getenv("CLUSTER_COUNT", "0")) or os.cpu_count() or 1
+    CLUSTER_ID = int(os.getenv("CLUSTER_ID", "0"))
+    CLUSTER_PORT_BASE = int(os.getenv("CLUSTER_PORT_BASE", "8081"))
+    # sync command tree เฉพาะเมื่อ hash ต่างจากที่บันทึกไว้ ค่าว่าง = sync ทุกครั้ง
+    COMMAND_TREE_HASH_PATH = os.getenv("COMMAND_TREE_HASH_PATH", "data/command_tree.sha256")
+
+    RESOLVER_CACHE_SIZE = int(os.getenv("RESOLVER_CACHE_SIZE", "1024"))
+    RESOLVER_CACHE_TTL = int(os.getenv("RESOLVER_CACHE_TTL", "3600"))
+
+    RESOLVER_WORKERS = int(os.getenv("RESOLVER_WORKERS", "4"))
+    RESOLVER_GUILD_INFLIGHT = int(os.getenv("RESOLVER_GUILD_INFLIGHT", "2"))
+    RESOLVER_GUILD_PENDING = int(os.getenv("RESOLVER_GUILD_PENDING", "25"))
+    YDL_MAX_USES = int(os.getenv("YDL_MAX_USES", "200"))
+    YDL_PREWARM = os.getenv("YDL_PREWARM", "1") == "1"
+
+    PLAYLIST_MAX_ENTRIES = int(os.getenv("PLAYLIST_MAX_ENTRIES", "500"))
+    PLAYLIST_BATCH_SIZE = int(os.getenv("PLAYLIST_BATCH_SIZE", "25"))
+
+    SEARCH_RESULTS = int(os.getenv("SEARCH_RESULTS", "5"))
+    SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2000"))
+    SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "3600"))
+    TITLE_INDEX_SIZE = int(os.getenv("TITLE_INDEX_SIZE", "5000"))
+
+    MULTI_QUERY_MAX = int(os.getenv("MULTI_QUERY_MAX", "10"))
+    MULTI_QUERY_CONCURRENCY = int(os.getenv("MULTI_QUERY_CONCURRENCY", "3"))
+    # ตัวคั่นหลายเพลงในบรรทัดเดียว ไม่ใช้ comma เพราะชื่อเพลงมี comma ได้
+    MULTI_QUERY_SEPARATOR = os.getenv("MULTI_QUERY_SEPARATOR", ";")
+
+    HISTORY_SIZE = int(os.getenv("HISTORY_SIZE", "50"))
+    QUEUE_MAX_TRACKS = int(os.getenv("QUEUE_MAX_TRACKS", "1000"))
+    TRACK_BUDGET = int(os.getenv("TRACK_BUDGET", "200000"))
+
+    OPUS_PASSTHROUGH = os.getenv("OPUS_PASSTHROUGH", "1") == "1"
+
+    QUEUE_DEDUPE = os.getenv("QUEUE_DEDUPE", "0") == "1"
+
+    PLAYBACK_ENGINE = os.getenv("PLAYBACK_ENGINE", "classic")
+    CROSSFADE_SECONDS = float(os.getenv("CROSSFADE_SECONDS", "0"))
+
+    DSP_ENABLED = os.getenv("DSP_ENABLED", "1") == "1"
+    LOUDNESS_NORMALIZE = os.getenv("LOUDNESS_NORMALIZE", "1") == "1"
+    LOUDNESS_TARGET = float(os.getenv("LOUDNESS_TARGET", "-16"))
+    LOUDNESS_MAX_BOOST = float(os.getenv("LOUDNESS_MAX_BOOST", "6"))
+    LOUDNESS_CACHE_SIZE = int(os.getenv("LOUDNESS_CACHE_SIZE", "50000"))
+
+    EMBED_BUCKET_SIZE = int(os.getenv("EMBED_BUCKET_SIZE", "5"))
+    EMBED_BUCKET_PERIOD = float(os.getenv("EMBED_BUCKET_PERIOD", "5"))
+    EMBED_GLOBAL_RATE = float(os.getenv("EMBED_GLOBAL_RATE", "40"))
+    EMBED_REFRESH_SECONDS = float(os.getenv("EMBED_REFRESH_SECONDS", "0"))
+
+    STORE_PATH = os.getenv("STORE_PATH", "data/music.db")
+    STORE_FLUSH_SECONDS = float(os.getenv("STORE_FLUSH_SECONDS", "5"))
+    RESTORE_CONCURRENCY = int(os.getenv("RESTORE_CONCURRENCY", "5"))
+
+    AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", "data/audio")
+    AUDIO_CACHE_MAX_MB = int(os.getenv("AUDIO_CACHE_MAX_MB", "2048"))
+    AUDIO_CACHE_MIN_PLAYS = int(os.getenv("AUDIO_CACHE_MIN_PLAYS", "2"))
+    AUDIO_CACHE_MAX_DURATION = int(os.getenv("AUDIO_CACHE_MAX_DURATION", "900"))
+
+    AUDIO_NODES = int(os.getenv("AUDIO_NODES", "0"))
+    AUDIO_NODE_LOCAL = os.getenv("AUDIO_NODE_LOCAL", "0") == "1"
+    AUDIO_NODE_DIR = os.getenv("AUDIO_NODE_DIR", "/tmp/musicbot-nodes")
+    AUDIO_NODE_BUFFER = int(os.getenv("AUDIO_NODE_BUFFER", "50"))
+
+    FFMPEG_MAX_PROCESSES = int(os.getenv("FFMPEG_MAX_PROCESSES", "256"))
+    FFMPEG_SLOT_DIR = os.getenv("FFMPEG_SLOT_DIR", "/tmp/musicbot-ffmpeg")
+    FFMPEG_SLOT_WAIT = float(os.getenv("FFMPEG_SLOT_WAIT", "10"))
+    FFMPEG_STALL_SECONDS = float(os.getenv("FFMPEG_STALL_SECONDS", "5"))
+    FFMPEG_MAX_RESTARTS = int(os.getenv("FFMPEG_MAX_RESTARTS", "3"))
+
+    VOICE_GRACE_SECONDS = float(os.getenv("VOICE_GRACE_SECONDS", "300"))
+    VOICE_CONNECT_CONCURRENCY = int(os.getenv("VOICE_CONNECT_CONCURRENCY", "4"))
+    VOICE_RECONNECT_WAIT = float(os.getenv("VOICE_RECONNECT_WAIT", "5"))
+    VOICE_IDLE_SECONDS = float(os.getenv("VOICE_IDLE_SECONDS", "120"))
+    PLAYER_IDLE_SECONDS = float(os.getenv("PLAYER_IDLE_SECONDS", "600"))
+    ROOM_IDLE_SECONDS = float(os.getenv("ROOM_IDLE_SECONDS", "86400"))
+
+    PREFETCH_DEPTH = int(os.getenv("PREFETCH_DEPTH", "2"))
+    PREFETCH_MARGIN = int(os.getenv("PREFETCH_MARGIN", "600"))
+    PREFETCH_WARM_SOURCE = os.getenv("PREFETCH_WARM_SOURCE", "0") == "1"
+
 
 settings = Settings()
@@ -1,9 +1,16 @@
+import time
+
+# เริ่มจับเวลาก่อน import อื่นๆ เพื่อให้รายงานเวลา startup รวมเวลา import ด้วย
+BOOT_STARTED = time.perf_counter()
+
 import discord
 from discord.ext import commands
 import logging
 import asyncio
 from aiohttp import web
 from config.settings import settings
+from utils import metrics
+from utils.startup import StartupTimer, command_tree_hash, read_tree_hash, write_tree_hash
 
 logging.basicConfig(
     level=logging.INFO,
@@ -11,43 +18,162 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()],
 )
 logger = logging.getLogger("bot")
+startup = StartupTimer(BOOT_STARTED)
+
+
+def build_intents():
+    if not settings.LEAN_MODE:
+        return discord.Intents.all()
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.guild_messages = True
+    intents.message_content = True
+    intents.voice_states = True
+    return intents
+
 
-intents = discord.Intents.all()
+intents = build_intents()
+
+
+def cache_options():
+    if not settings.LEAN_MODE:
+        return {}
+    # เก็บเฉพาะสมาชิกที่อยู่ในห้องเสียง ไม่ chunk สมาชิกทั้ง guild ตอนเริ่ม
+    return {
+        "member_cache_flags": discord.MemberCacheFlags.from_intents(intents),
+        "chunk_guilds_at_startup": False,
+        "max_messages": settings.MESSAGE_CACHE_SIZE or None,
+    }
+
+
+BotBase = (
+    commands.AutoShardedBot
+    if settings.SHARDING or settings.SHARD_IDS
+    else commands.Bot
+)
 
 
-class MusicBot(commands.Bot):
+def shard_options():
+    if BotBase is commands.Bot:
+        return {}
+    options = {"shard_count": settings.SHARD_COUNT}
+    if settings.SHARD_IDS:
+        options["shard_ids"] = settings.SHARD_IDS
+    return options
+
+
+def bot_shards(bot):
+    return getattr(bot, "shard_ids", None) or [bot.shard_id or 0]
+
+
+class MusicBot(BotBase):
     def __init__(self):
-        super().__init__(command_prefix="!", intents=intents)
+        super().__init__(
+            command_prefix="!",
+            intents=intents,
+            **cache_options(),
+            **shard_options(),
+        )
         self.synced = False
+        self.startup = startup
+        self.lag_monitor = None
 
     async def setup_hook(self):
+        self.startup.mark("login")
         await self.load_extension("cogs.music")
         logger.info("Loaded cog: music")
+        self.startup.mark("load_cogs")
+
+    async def close(self):
+        if self.lag_monitor is not None:
+            self.lag_monitor.cancel()
+            self.lag_monitor = None
+        await super().close()
 
     async def on_ready(self):
-        if not self.synced:
-            await self.tree.sync()
-            self.synced = True
-        logger.info(f"Bot is ready. Logged in as {self.user}")
+        self.startup.mark("gateway")
+        # ใน cluster mode ให้ sync command tree แค่ cluster แรก
+        if not self.synced and settings.CLUSTER_ID == 0:
+            self.synced = await self.sync_tree()
+            self.startup.mark("tree_sync")
+        logger.info(
+            f"Bot is ready. Logged in as {self.user} "
+            f"(cluster {settings.CLUSTER_ID}, shards {bot_shards(self)})"
+        )
+        self.startup.report()
+
+    async def sync_tree(self):
+        # sync เป็น REST call ที่ติด rate limit ข้ามเมื่อคำสั่งไม่เปลี่ยนจากครั้งก่อน
+        path = settings.COMMAND_TREE_HASH_PATH
+        digest = command_tree_hash(self.tree, self.application_id)
+        if path and read_tree_hash(path) == digest:
+            logger.info("Command tree unchanged, skipping sync")
+            return True
+        try:
+            commands_synced = await self.tree.sync()
+        except discord.HTTPException as e:
+            # ไม่บันทึก hash เพื่อให้ลองใหม่ใน on_ready หรือการ deploy ครั้งถัดไป
+            logger.warning(f"Could not sync command tree: {e}")
+            return False
+        if path:
+            try:
+                write_tree_hash(path, digest)
+            except OSError as e:
+                logger.warning(f"Could not save command tree hash: {e}")
+        logger.info(f"Synced {len(commands_synced)} application commands")
+        return True
 
 
 async def handle_ping(request):
     return web.Response(text="Bot is alive!")
 
 
-async def run_webserver():
+async def run_webserver(bot):
+    async def handle_metrics(request):
+        return web.Response(
+            text=metrics.registry.render(),
+            content_type="text/plain",
+            charset="utf-8",
+        )
+
+    async def handle_health(request):
+        return web.json_response(
+            {
+                "cluster": settings.CLUSTER_ID,
+                "ready": bot.is_ready(),
+                "shards": bot_shards(bot),
+                "guilds": len(bot.guilds),
+                "latency": bot.latency if bot.is_ready() else None,
+            }
+        )
+
+    async def handle_debug_players(request):
+        cog = bot.get_cog("Music")
+        return web.json_response(cog.debug_players() if cog else [])
+
     app = web.Application()
-    app.add_routes([web.get("/", handle_ping)])
+    app.add_routes(
+        [
+            web.get("/", handle_ping),
+            web.get("/health", handle_health),
+            web.get("/metrics", handle_metrics),
+            web.get("/debug/players", handle_debug_players),
+        ]
+    )
     runner = web.AppRunner(app)
     await runner.setup()
-    site = web.TCPSite(runner, "0.0.0.0", 8080)
+    site = web.TCPSite(runner, settings.WEB_HOST, settings.WEB_PORT)
     await site.start()
-    logger.info("Web server started on port 8080")
+    logger.info(f"Web server started on port {settings.WEB_PORT}")
 
 
 async def main():
+    startup.mark("imports")
     bot = MusicBot()
-    await run_webserver()
+    metrics.registry.collector(startup.collect_metrics)
+    bot.lag_monitor = asyncio.create_task(metrics.monitor_loop_lag())
+    await run_webserver(bot)
+    startup.mark("webserver")
     await bot.start(settings.TOKEN)
 
 
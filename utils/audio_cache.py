@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import os
+import re
+from collections import OrderedDict
+
+logger = logging.getLogger("music.audio_cache")
+
+SUFFIX = ".ogg"
+# บรรทัดสรุปของ filter ebur128 เช่น "    I:         -14.2 LUFS"
+INTEGRATED = re.compile(rb"^\s*I:\s+(-?\d+(?:\.\d+)?) LUFS", re.MULTILINE)
+
+
+def _lower_priority():
+    os.nice(10)
+
+
+class AudioCache:
+    """Size-bounded LRU of Ogg/Opus files keyed by video id.
+
+    Tracks are written by a single background worker running ffmpeg at a
+    lower CPU priority through the FFmpegSupervisor, so fills count
+    against the per-host decoder cap, into a temporary file that is renamed into place
+    once complete, so readers never see a partial file. The index and the
+    size budget belong to one process, so each process needs a directory
+    of its own; the cluster launcher gives every cluster a subdirectory.
+    With ``on_loudness`` set, the same ffmpeg run also measures integrated
+    loudness and reports it as ``on_loudness(video_id, lufs)``.
+    """
+
+    def __init__(
+        self,
+        directory,
+        max_bytes,
+        supervisor,
+        min_plays=2,
+        max_duration=900,
+        on_loudness=None,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.supervisor = supervisor
+        self.min_plays = min_plays
+        self.max_duration = max_duration
+        self.on_loudness = on_loudness
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.fills = 0
+        self._index = OrderedDict()
+        self._plays = OrderedDict()
+        self._pending = set()
+        self._jobs = asyncio.Queue()
+        self._task = None
+
+    def path(self, video_id):
+        return os.path.join(self.directory, video_id + SUFFIX)
+
+    def load(self):
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            full = os.path.join(self.directory, name)
+            if name.endswith(".part"):
+                os.remove(full)
+                continue
+            if not name.endswith(SUFFIX):
+                continue
+            stat = os.stat(full)
+            entries.append((stat.st_atime, name[: -len(SUFFIX)], stat.st_size))
+        for _, video_id, size in sorted(entries):
+            self._index[video_id] = size
+            self.total_bytes += size
+        self._evict()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._worker())
+
+    def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def get(self, video_id):
+        # stat ไฟล์เฉพาะตอนจะเปิดเล่นจริง ส่วน is_cached เชื่อ index อย่างเดียว
+        if self.is_cached(video_id):
+            if os.path.exists(self.path(video_id)):
+                self._index.move_to_end(video_id)
+                self.hits += 1
+                return self.path(video_id)
+            # ไฟล์ถูกลบไปจากภายนอก ถือว่า miss และลบออกจาก index
+            self.total_bytes -= self._index.pop(video_id)
+        self.misses += 1
+        return None
+
+    def is_cached(self, video_id):
+        return bool(video_id) and video_id in self._index
+
+    def __contains__(self, video_id):
+        return self.is_cached(video_id)
+
+    def record_play(self, track):
+        video_id = track.video_id
+        if not video_id or video_id in self._index or video_id in self._pending:
+            return
+        if not track.url or not track.duration or track.duration > self.max_duration:
+            return
+        plays = self._plays.pop(video_id, 0) + 1
+        self._plays[video_id] = plays
+        while len(self._plays) > 10000:
+            self._plays.popitem(last=False)
+        if plays >= self.min_plays:
+            self._pending.add(video_id)
+            self._jobs.put_nowait((video_id, track.url, track.acodec))
+
+    async def _worker(self):
+        while True:
+            video_id, url, acodec = await self._jobs.get()
+            try:
+                await self._fill(video_id, url, acodec)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Error caching {video_id}: {e}")
+            finally:
+                self._pending.discard(video_id)
+
+    async def _fill(self, video_id, url, acodec):
+        final = self.path(video_id)
+        temp = final + ".part"
+        codec = ["-c:a", "copy"] if acodec == "opus" else ["-c:a", "libopus", "-b:a", "128k"]
+        measure = []
+        if self.on_loudness is not None:
+            # output ที่สอง decode เสียงเข้า ebur128 เพื่อวัดความดังไปพร้อมกัน
+            measure = ["-map", "0:a", "-af", "ebur128=framelog=verbose", "-f", "null", "-"]
+        returncode, _, stderr = await self.supervisor.run(
+            [
+                "ffmpeg",
+                "-nostdin",
+                "-hide_banner",
+                "-nostats",
+                "-loglevel",
+                "info" if measure else "error",
+                "-y",
+                "-reconnect",
+                "1",
+                "-reconnect_streamed",
+                "1",
+                "-i",
+                url,
+                "-vn",
+                "-map_metadata",
+                "-1",
+                *codec,
+                "-f",
+                "ogg",
+                temp,
+                *measure,
+            ],
+            preexec_fn=_lower_priority,
+        )
+        if returncode != 0:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise RuntimeError(stderr.decode(errors="ignore").strip()[-200:])
+
+        os.replace(temp, final)
+        size = os.path.getsize(final)
+        self._index[video_id] = size
+        self.total_bytes += size
+        self.fills += 1
+        self._evict()
+        logger.info(f"Cached {video_id} ({size // 1024} KiB)")
+        if measure:
+            self._report_loudness(video_id, stderr)
+
+    def _report_loudness(self, video_id, stderr):
+        matches = INTEGRATED.findall(stderr)
+        if not matches:
+            return
+        lufs = float(matches[-1])
+        # ebur128 รายงาน -70 สำหรับเพลงที่เงียบทั้งเพลง
+        if lufs > -70:
+            self.on_loudness(video_id, lufs)
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._index:
+            video_id, size = self._index.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self.path(video_id))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        return {
+            "entries": len(self._index),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "fills": self.fills,
+        }
@@ -0,0 +1,491 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import shlex
+import struct
+import sys
+import threading
+from collections import deque
+
+import discord
+
+from utils import metrics
+from utils.dsp import AVAILABLE as DSP_AVAILABLE, DSPChain, LoudnessCache
+
+logger = logging.getLogger("music.audio_node")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FRAME_SIZE = discord.opus.Encoder.FRAME_SIZE
+FRAME_SAMPLES = discord.opus.Encoder.SAMPLES_PER_FRAME
+
+# ชนิด, stream id, ความยาว payload
+HEADER = struct.Struct(">BII")
+CREDIT = struct.Struct(">I")
+
+OPEN = 1
+FRAME = 2
+END = 3
+CLOSE = 4
+GRANT = 5
+SET = 6
+
+
+async def read_message(reader):
+    kind, stream_id, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+    payload = await reader.readexactly(length) if length else b""
+    return kind, stream_id, payload
+
+
+def pack_message(kind, stream_id, payload=b""):
+    return HEADER.pack(kind, stream_id, len(payload)) + payload
+
+
+class WorkerStream:
+    """One track inside a worker: ffmpeg -> loudness/DSP -> Opus packets.
+
+    Packets are only sent while the bot has granted credit, so at most
+    ``buffer`` frames of a stream are in flight at any time.
+    """
+
+    def __init__(self, stream_id, request, writer, on_done):
+        self.stream_id = stream_id
+        self.request = request
+        self.writer = writer
+        self.on_done = on_done
+        self.credits = 0
+        self.process = None
+        self.chain = None
+        self.stage = None
+        self.cache = None
+        self._credit = asyncio.Event()
+        self._task = None
+        if DSP_AVAILABLE and request.get("dsp"):
+            self.chain = DSPChain(request.get("volume", 1.0), request.get("preset", "flat"))
+            loudness = request.get("loudness")
+            if loudness is not None:
+                self.cache = LoudnessCache(
+                    1, target=loudness["target"], max_boost=loudness["max_boost"]
+                )
+                if loudness.get("lufs") is not None:
+                    self.cache.load([(request.get("video_id"), loudness["lufs"])])
+                self.stage = self.chain.track_stage(
+                    request.get("video_id"),
+                    self.cache,
+                    request.get("duration", 0),
+                    request.get("seek", 0),
+                )
+        self.encoder = discord.opus.Encoder()
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    def grant(self, count):
+        self.credits += count
+        self._credit.set()
+
+    def configure(self, params):
+        if self.chain is not None:
+            self.chain.volume = params.get("volume", self.chain.volume)
+            self.chain.set_preset(params.get("preset", self.chain.preset))
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def _args(self):
+        request = self.request
+        return [
+            *shlex.split(request.get("before_options") or ""),
+            "-i",
+            request["url"],
+            "-f",
+            "s16le",
+            "-ar",
+            "48000",
+            "-ac",
+            "2",
+            "-loglevel",
+            "warning",
+            *shlex.split(request.get("options") or ""),
+            "pipe:1",
+        ]
+
+    def _send(self, kind, payload=b""):
+        if not self.writer.is_closing():
+            self.writer.write(pack_message(kind, self.stream_id, payload))
+
+    async def _run(self):
+        error = None
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                "ffmpeg",
+                *self._args(),
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+            stdout = self.process.stdout
+            while True:
+                last = False
+                try:
+                    data = await stdout.readexactly(FRAME_SIZE)
+                except asyncio.IncompleteReadError as e:
+                    if not e.partial:
+                        break
+                    data = e.partial + b"\0" * (FRAME_SIZE - len(e.partial))
+                    last = True
+                if self.stage is not None:
+                    data = self.stage.process(data)
+                if self.chain is not None:
+                    data = self.chain.process(data)
+                packet = self.encoder.encode(data, FRAME_SAMPLES)
+                while self.credits <= 0:
+                    self._credit.clear()
+                    await self._credit.wait()
+                self.credits -= 1
+                self._send(FRAME, packet)
+                if last:
+                    break
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            error = str(e)
+        finally:
+            if self.process is not None and self.process.returncode is None:
+                self.process.kill()
+        self._finish(error)
+
+    def _finish(self, error):
+        info = {"error": error}
+        if self.stage is not None:
+            self.stage.close()
+            for video_id, lufs in self.cache.drain():
+                info["video_id"] = video_id
+                info["lufs"] = lufs
+        self._send(END, json.dumps(info).encode())
+        self.on_done(self.stream_id)
+
+
+class AudioWorker:
+    """Audio node: serves WorkerStreams to a bot process over a unix socket.
+
+    ``python -m utils.audio_node PATH`` runs one as its own process; the
+    bot can also start one in-process (see ``AudioNodePool(local=True)``).
+    """
+
+    def __init__(self, path, exit_on_disconnect=False):
+        self.path = path
+        self.exit_on_disconnect = exit_on_disconnect
+        self.server = None
+        self.connections = []
+        self._done = asyncio.Event()
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._serve, path=self.path)
+
+    async def run(self):
+        await self.start()
+        await self._done.wait()
+        await self.close()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+        for streams in self.connections:
+            for stream in list(streams.values()):
+                stream.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def _serve(self, reader, writer):
+        streams = {}
+        self.connections.append(streams)
+        try:
+            while True:
+                kind, stream_id, payload = await read_message(reader)
+                stream = streams.get(stream_id)
+                if kind == OPEN:
+                    stream = WorkerStream(
+                        stream_id,
+                        json.loads(payload),
+                        writer,
+                        lambda done_id: streams.pop(done_id, None),
+                    )
+                    streams[stream_id] = stream
+                    stream.start()
+                elif stream is None:
+                    continue
+                elif kind == GRANT:
+                    stream.grant(CREDIT.unpack(payload)[0])
+                elif kind == SET:
+                    stream.configure(json.loads(payload))
+                elif kind == CLOSE:
+                    stream.close()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections.remove(streams)
+            for stream in list(streams.values()):
+                stream.close()
+            writer.close()
+            if self.exit_on_disconnect:
+                self._done.set()
+
+
+class NodeStream(discord.AudioSource):
+    """Opus packets of one track, received from an audio node.
+
+    ``read`` runs on the voice player thread and blocks until the node
+    sends the next packet or ends the stream.
+    """
+
+    def __init__(self, node, stream_id, buffer):
+        self.node = node
+        self.stream_id = stream_id
+        self._frames = deque()
+        self._cond = threading.Condition()
+        self._ended = False
+        self._consumed = 0
+        self._refill = max(1, buffer // 2)
+
+    def is_opus(self):
+        return True
+
+    def read(self):
+        with self._cond:
+            while not self._frames and not self._ended:
+                self._cond.wait()
+            if not self._frames:
+                return b""
+            packet = self._frames.popleft()
+            self._consumed += 1
+            granted = 0
+            if self._consumed >= self._refill:
+                granted, self._consumed = self._consumed, 0
+        if granted:
+            self.node.send(GRANT, self.stream_id, CREDIT.pack(granted))
+        return packet
+
+    def configure(self, **params):
+        if not self._ended:
+            self.node.send(SET, self.stream_id, json.dumps(params).encode())
+
+    def kill(self):
+        if not self._ended:
+            self.node.send(CLOSE, self.stream_id)
+        with self._cond:
+            self._frames.clear()
+        self._finish()
+
+    def cleanup(self):
+        self.kill()
+
+    def _push(self, packet):
+        with self._cond:
+            self._frames.append(packet)
+            self._cond.notify()
+
+    def _finish(self):
+        with self._cond:
+            self._ended = True
+            self._cond.notify_all()
+
+
+class AudioNode:
+    """The bot side of one connection to an AudioWorker."""
+
+    def __init__(self, pool, index, path):
+        self.pool = pool
+        self.index = index
+        self.path = path
+        self.streams = {}
+        self.alive = False
+        self.loop = None
+        self._ids = itertools.count(1)
+        self._reader = None
+        self._writer = None
+        self._task = None
+
+    async def connect(self, timeout=10.0):
+        self.loop = asyncio.get_running_loop()
+        deadline = self.loop.time() + timeout
+        while True:
+            try:
+                self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                # worker ยังเปิด socket ไม่เสร็จ
+                if self.loop.time() >= deadline:
+                    raise
+                await asyncio.sleep(0.1)
+        self.alive = True
+        self._task = asyncio.create_task(self._read_loop())
+
+    def close(self):
+        self.alive = False
+        if self._task is not None:
+            self._task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+        self._drop_streams()
+
+    def open(self, request, buffer):
+        stream_id = next(self._ids)
+        stream = NodeStream(self, stream_id, buffer)
+        self.streams[stream_id] = stream
+        self.send(OPEN, stream_id, json.dumps(request).encode())
+        self.send(GRANT, stream_id, CREDIT.pack(buffer))
+        return stream
+
+    def send(self, kind, stream_id, payload=b""):
+        # เรียกได้ทั้งจาก event loop และ thread ของ voice player
+        self.loop.call_soon_threadsafe(self._write, pack_message(kind, stream_id, payload))
+
+    def _write(self, data):
+        if self.alive and not self._writer.is_closing():
+            self._writer.write(data)
+
+    async def _read_loop(self):
+        try:
+            while True:
+                kind, stream_id, payload = await read_message(self._reader)
+                if kind == FRAME:
+                    stream = self.streams.get(stream_id)
+                    if stream is not None:
+                        stream._push(payload)
+                elif kind == END:
+                    stream = self.streams.pop(stream_id, None)
+                    info = json.loads(payload)
+                    if info.get("error"):
+                        logger.warning(f"Audio node {self.index} stream failed: {info['error']}")
+                    if info.get("lufs") is not None:
+                        self.pool.measured(info["video_id"], info["lufs"])
+                    if stream is not None:
+                        stream._finish()
+        except asyncio.CancelledError:
+            return
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            logger.warning(f"Lost audio node {self.index}: {e!r}")
+        self.alive = False
+        self._drop_streams()
+        self.pool.node_lost(self)
+
+    def _drop_streams(self):
+        # stream ที่ค้างอยู่จะคืน b"" แล้ว supervisor ของ cog จะเปิดใหม่บน node อื่น
+        streams, self.streams = self.streams, {}
+        for stream in streams.values():
+            stream._finish()
+
+
+class AudioNodePool:
+    """Worker processes that decode, process and encode audio for the bot.
+
+    The bot process keeps only control state and the voice connection;
+    each track is opened on the least loaded node and arrives as Opus
+    packets. With ``local`` a single in-process worker stands in for the
+    pool. Lost workers are restarted and their streams are reopened by
+    the cog's ffmpeg supervisor.
+    """
+
+    def __init__(self, count, directory, buffer=50, local=False, on_loudness=None):
+        self.count = 1 if local else count
+        self.directory = directory
+        self.buffer = buffer
+        self.local = local
+        self.on_loudness = on_loudness
+        self.nodes = [None] * self.count
+        self.processes = [None] * self.count
+        self.workers = [None] * self.count
+        self._closing = False
+
+    async def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        for index in range(self.count):
+            await self._spawn(index)
+
+    async def _spawn(self, index):
+        path = os.path.join(self.directory, f"node-{os.getpid()}-{index}.sock")
+        if self.local:
+            worker = AudioWorker(path)
+            await worker.start()
+            self.workers[index] = worker
+        else:
+            self.processes[index] = await asyncio.create_subprocess_exec(
+                sys.executable, "-m", "utils.audio_node", path, cwd=ROOT
+            )
+        node = AudioNode(self, index, path)
+        await node.connect()
+        self.nodes[index] = node
+        logger.info(f"Audio node {index} ready at {path}")
+
+    async def close(self):
+        self._closing = True
+        for node in self.nodes:
+            if node is not None:
+                node.close()
+        for process in self.processes:
+            if process is not None and process.returncode is None:
+                process.terminate()
+                try:
+                    await asyncio.wait_for(process.wait(), 5)
+                except asyncio.TimeoutError:
+                    process.kill()
+        for worker in self.workers:
+            if worker is not None:
+                await worker.close()
+
+    def open(self, request):
+        nodes = [node for node in self.nodes if node is not None and node.alive]
+        if not nodes:
+            raise RuntimeError("No audio node available")
+        node = min(nodes, key=lambda node: len(node.streams))
+        return node.open(request, self.buffer)
+
+    def measured(self, video_id, lufs):
+        if self.on_loudness is not None:
+            self.on_loudness(video_id, lufs)
+
+    def node_lost(self, node):
+        if not self._closing:
+            asyncio.create_task(self._restart(node.index))
+
+    async def _restart(self, index):
+        metrics.AUDIO_NODE_RESTARTS.inc()
+        process = self.processes[index]
+        if process is not None and process.returncode is None:
+            process.kill()
+        worker = self.workers[index]
+        if worker is not None:
+            await worker.close()
+        delay = 1
+        while not self._closing:
+            await asyncio.sleep(delay)
+            try:
+                await self._spawn(index)
+                return
+            except Exception as e:
+                logger.error(f"Could not restart audio node {index}: {e}")
+                delay = min(delay * 2, 30)
+
+    def stats(self):
+        return [
+            (index, len(node.streams) if node is not None and node.alive else 0)
+            for index, node in enumerate(self.nodes)
+        ]
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
+    )
+    asyncio.run(AudioWorker(sys.argv[1], exit_on_disconnect=True).run())
+
+
+if __name__ == "__main__":
+    main()
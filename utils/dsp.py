@@ -0,0 +1,335 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import discord
+
+from utils import metrics
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+AVAILABLE = np is not None
+
+logger = logging.getLogger("music.dsp")
+
+SAMPLE_RATE = discord.opus.Encoder.SAMPLING_RATE
+CHANNELS = discord.opus.Encoder.CHANNELS
+FRAME_SAMPLES = discord.opus.Encoder.SAMPLES_PER_FRAME
+FFT_SIZE = 2048
+EQ_TAPS = 1025
+MIN_MEASURE_FRAMES = 500  # 10 วินาที
+MAX_MEASURE_FRAMES = 60000  # 20 นาที
+MEASURE_COVERAGE = 0.9  # ต้องวัดได้อย่างน้อย 90% ของเพลงถึงจะเก็บค่า
+FRAME_SECONDS = discord.opus.Encoder.FRAME_LENGTH / 1000
+
+# (ชนิด, ความถี่กลาง Hz, gain dB, Q)
+EQ_PRESETS = {
+    "flat": (),
+    "bass": (("lowshelf", 100, 6.0, 0.7),),
+    "bass_boost": (("lowshelf", 80, 10.0, 0.7), ("peaking", 2500, -2.0, 1.0)),
+    "vocal": (("peaking", 200, -3.0, 0.8), ("peaking", 3000, 4.0, 1.0)),
+    "treble": (("highshelf", 6000, 6.0, 0.7),),
+    "night": (("lowshelf", 120, -6.0, 0.7), ("highshelf", 8000, -4.0, 0.7)),
+}
+
+# ตัวกรอง K-weighting ของ ITU-R BS.1770 ที่ 48 kHz
+K_WEIGHTING = (
+    (
+        (1.53512485958697, -2.69169618940638, 1.19839281085285),
+        (1.0, -1.69065929318241, 0.73248077421585),
+    ),
+    ((1.0, -2.0, 1.0), (1.0, -1.99004745483398, 0.99007225036621)),
+)
+
+
+def _response(sections):
+    # ค่าตอบสนองความถี่ของ biquad หลายตัวต่อกัน ที่ตำแหน่ง bin ของ rfft
+    freqs = np.fft.rfftfreq(FFT_SIZE, 1 / SAMPLE_RATE)
+    z = np.exp(-2j * np.pi * freqs / SAMPLE_RATE)
+    response = np.ones(len(freqs), dtype=np.complex128)
+    for b, a in sections:
+        response *= np.polyval(b[::-1], z) / np.polyval(a[::-1], z)
+    return response
+
+
+def _biquad(kind, f0, gain_db, q):
+    # สูตรจาก Audio EQ Cookbook (RBJ)
+    amp = 10 ** (gain_db / 40)
+    w0 = 2 * np.pi * f0 / SAMPLE_RATE
+    cos_w0 = np.cos(w0)
+    alpha = np.sin(w0) / (2 * q)
+    if kind == "peaking":
+        b = (1 + alpha * amp, -2 * cos_w0, 1 - alpha * amp)
+        a = (1 + alpha / amp, -2 * cos_w0, 1 - alpha / amp)
+    else:
+        sqrt_amp = 2 * np.sqrt(amp) * alpha
+        sign = 1 if kind == "lowshelf" else -1
+        b = (
+            amp * ((amp + 1) - sign * (amp - 1) * cos_w0 + sqrt_amp),
+            sign * 2 * amp * ((amp - 1) - sign * (amp + 1) * cos_w0),
+            amp * ((amp + 1) - sign * (amp - 1) * cos_w0 - sqrt_amp),
+        )
+        a = (
+            (amp + 1) + sign * (amp - 1) * cos_w0 + sqrt_amp,
+            -sign * 2 * ((amp - 1) + sign * (amp + 1) * cos_w0),
+            (amp + 1) + sign * (amp - 1) * cos_w0 - sqrt_amp,
+        )
+    return np.array(b) / a[0], np.array(a) / a[0]
+
+
+_eq_cache = {}
+
+
+def eq_spectrum(preset):
+    """FFT of a linear-phase FIR approximating ``preset``, or None for flat."""
+    sections = EQ_PRESETS[preset]
+    if not sections:
+        return None
+    if preset not in _eq_cache:
+        magnitude = np.abs(_response([_biquad(*section) for section in sections]))
+        taps = np.roll(np.fft.irfft(magnitude, FFT_SIZE), EQ_TAPS // 2)[:EQ_TAPS]
+        taps *= np.hanning(EQ_TAPS)
+        _eq_cache[preset] = np.fft.rfft(taps, FFT_SIZE).astype(np.complex64)[:, None]
+    return _eq_cache[preset]
+
+
+_k_weights = None
+
+
+def k_weights():
+    # น้ำหนักต่อ bin สำหรับหาพลังงานหลัง K-weighting ด้วย Parseval
+    global _k_weights
+    if _k_weights is None:
+        weights = np.abs(_response(K_WEIGHTING)) ** 2
+        weights[1:-1] *= 2
+        _k_weights = (weights / (FFT_SIZE * FRAME_SAMPLES)).astype(np.float32)
+    return _k_weights
+
+
+def integrated_loudness(energies):
+    """Gated integrated loudness (LUFS) from per-frame K-weighted mean squares."""
+    energies = np.asarray(energies, dtype=np.float64)
+    # block 400 ms ซ้อนกัน 75% ตาม BS.1770
+    blocks = np.convolve(energies, np.full(20, 1 / 20), mode="valid")[::5]
+    blocks = blocks[blocks > 0]
+    if not len(blocks):
+        return None
+    loudness = -0.691 + 10 * np.log10(blocks)
+    blocks = blocks[loudness > -70]
+    if not len(blocks):
+        return None
+    relative = -0.691 + 10 * np.log10(blocks.mean()) - 10
+    blocks = blocks[-0.691 + 10 * np.log10(blocks) > relative]
+    return float(-0.691 + 10 * np.log10(blocks.mean()))
+
+
+class LoudnessCache:
+    """Measured integrated loudness per video id, bounded LRU.
+
+    New measurements are also kept in ``pending`` until the cog drains them
+    into the state store.
+    """
+
+    def __init__(self, max_size, target=-16.0, max_boost=6.0, max_cut=20.0):
+        self.max_size = max_size
+        self.target = target
+        self.max_boost = max_boost
+        self.max_cut = max_cut
+        self.pending = []
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, video_id):
+        with self._lock:
+            lufs = self._data.get(video_id)
+            if lufs is not None:
+                self._data.move_to_end(video_id)
+            return lufs
+
+    def put(self, video_id, lufs, persist=True):
+        with self._lock:
+            self._data[video_id] = lufs
+            self._data.move_to_end(video_id)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+            if persist:
+                self.pending.append((video_id, lufs))
+
+    def load(self, measurements):
+        for video_id, lufs in measurements:
+            self.put(video_id, lufs, persist=False)
+
+    def drain(self):
+        with self._lock:
+            pending, self.pending = self.pending, []
+        return pending
+
+    def requeue(self, pending):
+        # คืนค่าที่เขียนไม่สำเร็จไว้หน้ารายการ เพื่อเขียนใหม่ในรอบถัดไป
+        with self._lock:
+            self.pending[:0] = pending
+
+    def gain(self, lufs):
+        gain_db = min(self.max_boost, max(-self.max_cut, self.target - lufs))
+        return 10 ** (gain_db / 20)
+
+
+class TrackStage:
+    """Per-track loudness stage: measures unknown tracks, normalizes known ones.
+
+    A measurement is only kept when it started at the beginning of the
+    track and covered most of it, so skips and seeks never store the
+    loudness of a fragment.
+    """
+
+    __slots__ = ("chain", "video_id", "cache", "gain", "energies", "needed")
+
+    def __init__(self, chain, video_id, cache, duration=0, seek=0):
+        self.chain = chain
+        self.video_id = video_id
+        self.cache = cache
+        lufs = cache.get(video_id)
+        self.gain = cache.gain(lufs) if lufs is not None else 1.0
+        # ไม่รู้ความยาวเพลงหรือเริ่มกลางเพลง วัดแล้วก็ไม่ได้ค่าของทั้งเพลง
+        measure = lufs is None and duration and not seek
+        self.energies = [] if measure else None
+        needed = int(duration * MEASURE_COVERAGE / FRAME_SECONDS) if measure else 0
+        self.needed = max(MIN_MEASURE_FRAMES, min(MAX_MEASURE_FRAMES, needed))
+
+    def process(self, data):
+        if self.energies is None and self.gain == 1.0:
+            return data
+        started = time.perf_counter()
+        samples = np.frombuffer(data, dtype=np.int16).reshape(-1, CHANNELS)
+        if self.energies is not None and len(self.energies) < MAX_MEASURE_FRAMES:
+            spectrum = np.fft.rfft(samples / 32768.0, FFT_SIZE, axis=0)
+            power = spectrum.real**2 + spectrum.imag**2
+            self.energies.append(float(k_weights() @ power.sum(axis=1)))
+        if self.gain != 1.0:
+            scaled = samples * np.float32(self.gain)
+            data = np.clip(scaled, -32768, 32767).astype(np.int16).tobytes()
+        self.chain.pending_seconds += time.perf_counter() - started
+        return data
+
+    def close(self):
+        energies, self.energies = self.energies, None
+        if energies is None or len(energies) < self.needed:
+            return
+        lufs = integrated_loudness(energies)
+        if lufs is not None:
+            self.cache.put(self.video_id, lufs)
+            logger.debug(f"Measured {self.video_id} at {lufs:.1f} LUFS")
+
+
+class DSPChain:
+    """Per-guild output stage: volume with a per-frame ramp and an FIR equalizer.
+
+    All work is done on whole 20 ms frames with NumPy. The EQ is applied
+    with FFT overlap-add, so its cost does not depend on the preset.
+    """
+
+    def __init__(self, volume=1.0, preset="flat"):
+        self.volume = volume
+        self.preset = preset
+        self.frames = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.pending_seconds = 0.0
+        self._gain = volume
+        self._spectrum = eq_spectrum(preset)
+        self._tail = None
+
+    @property
+    def neutral(self):
+        return self.volume == 1.0 and self._gain == 1.0 and self._spectrum is None
+
+    def set_preset(self, preset):
+        if preset != self.preset:
+            self.preset = preset
+            self._spectrum = eq_spectrum(preset)
+            self._tail = None
+
+    def track_stage(self, video_id, cache, duration=0, seek=0):
+        if cache is None or not video_id:
+            return None
+        return TrackStage(self, video_id, cache, duration, seek)
+
+    def process(self, data):
+        started = time.perf_counter()
+        if not self.neutral:
+            data = self._process(data)
+        elapsed = self.pending_seconds + time.perf_counter() - started
+        self.pending_seconds = 0.0
+        self.frames += 1
+        self.total_seconds += elapsed
+        if elapsed > self.max_seconds:
+            self.max_seconds = elapsed
+        metrics.DSP_FRAME_SECONDS.observe(elapsed)
+        return data
+
+    def _process(self, data):
+        samples = np.frombuffer(data, dtype=np.int16).reshape(-1, CHANNELS)
+        samples = samples.astype(np.float32)
+        if self._spectrum is not None:
+            samples = self._equalize(samples)
+
+        target = self.volume
+        if self._gain != target:
+            # ไล่ระดับเสียงภายใน frame เดียว เพื่อไม่ให้เกิดเสียงคลิก
+            ramp = np.linspace(self._gain, target, len(samples), dtype=np.float32)
+            samples *= ramp[:, None]
+            self._gain = target
+        elif target != 1.0:
+            samples *= np.float32(target)
+        return np.clip(samples, -32768, 32767).astype(np.int16).tobytes()
+
+    def _equalize(self, samples):
+        count = len(samples)
+        spectrum = np.fft.rfft(samples, FFT_SIZE, axis=0)
+        filtered = np.fft.irfft(spectrum * self._spectrum, FFT_SIZE, axis=0)
+        if self._tail is not None:
+            filtered[: len(self._tail)] += self._tail
+        self._tail = filtered[count:].astype(np.float32)
+        return filtered[:count].astype(np.float32)
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "avg_ms": self.total_seconds / self.frames * 1000 if self.frames else 0.0,
+            "max_ms": self.max_seconds * 1000,
+        }
+
+
+class DSPSource(discord.AudioSource):
+    """Runs PCM frames of ``source`` through a guild's DSPChain."""
+
+    def __init__(self, source, chain, stage=None):
+        self.source = source
+        self.chain = chain
+        self.stage = stage
+
+    def read(self):
+        data = self.source.read()
+        if not data:
+            return data
+        if len(data) < FRAME_SAMPLES * CHANNELS * 2:
+            data += b"\0" * (FRAME_SAMPLES * CHANNELS * 2 - len(data))
+        if self.stage is not None:
+            data = self.stage.process(data)
+        return self.chain.process(data)
+
+    def is_opus(self):
+        return False
+
+    def cleanup(self):
+        if self.stage is not None:
+            self.stage.close()
+            self.stage = None
+        self.source.cleanup()
@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+import discord
+
+from utils import metrics
+
+logger = logging.getLogger("music.embeds")
+
+
+def embed_fingerprint(embed):
+    data = embed.to_dict()
+    data.pop("timestamp", None)
+    return hashlib.sha1(
+        json.dumps(data, sort_keys=True, ensure_ascii=False).encode()
+    ).hexdigest()
+
+
+class _Bucket:
+    __slots__ = ("tokens", "updated", "blocked_until")
+
+    def __init__(self, capacity):
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+
+class EmbedScheduler:
+    """Serializes now-playing message edits for every guild.
+
+    Requests for the same guild are coalesced, so only the latest player
+    state is rendered when the edit is actually sent. Edits are spread
+    out with a token bucket per channel, mirroring Discord's per-channel
+    message routes, and a global minimum spacing between REST calls.
+    """
+
+    def __init__(self, render, bucket_size=5, bucket_period=5.0, global_rate=40):
+        self.render = render
+        self.bucket_size = bucket_size
+        self.refill_rate = bucket_size / bucket_period
+        self.global_interval = 1.0 / global_rate
+        self.edits = 0
+        self.sends = 0
+        self.skipped = 0
+        self.rate_limited = 0
+        self.last_latency = 0.0
+        self._pending = {}
+        self._fingerprints = {}
+        self._buckets = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def request(self, guild_id, player):
+        self._pending[guild_id] = player
+        self._wakeup.set()
+
+    def discard(self, guild_id):
+        self._pending.pop(guild_id, None)
+        self._fingerprints.pop(guild_id, None)
+
+    def _bucket_delay(self, channel_id, now):
+        bucket = self._buckets.get(channel_id)
+        if bucket is None:
+            bucket = self._buckets[channel_id] = _Bucket(self.bucket_size)
+        bucket.tokens = min(
+            self.bucket_size,
+            bucket.tokens + (now - bucket.updated) * self.refill_rate,
+        )
+        bucket.updated = now
+        if bucket.blocked_until > now:
+            return bucket.blocked_until - now
+        if bucket.tokens >= 1:
+            return 0.0
+        return (1 - bucket.tokens) / self.refill_rate
+
+    def _take(self):
+        now = time.monotonic()
+        wait = None
+        for gid, player in self._pending.items():
+            channel = player.channel
+            delay = self._bucket_delay(channel.id, now) if channel else 0.0
+            if delay <= 0:
+                del self._pending[gid]
+                if channel:
+                    self._buckets[channel.id].tokens -= 1
+                return gid, player, 0.0
+            wait = delay if wait is None else min(wait, delay)
+        return None, None, wait
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                guild_id, player, wait = self._take()
+                if player is None:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                        self._wakeup.clear()
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                try:
+                    await self._flush(guild_id, player)
+                except Exception as e:
+                    logger.warning(f"Error updating now playing embed: {e}")
+                await asyncio.sleep(self.global_interval)
+            self._prune()
+
+    def _prune(self):
+        now = time.monotonic()
+        for channel_id in list(self._buckets):
+            if self._bucket_delay(channel_id, now) == 0.0:
+                if self._buckets[channel_id].tokens >= self.bucket_size:
+                    del self._buckets[channel_id]
+
+    async def _flush(self, guild_id, player):
+        if player.current is None or player.channel is None:
+            return
+        embed, view = self.render(player)
+        fingerprint = embed_fingerprint(embed)
+        if player.message and self._fingerprints.get(guild_id) == fingerprint:
+            self.skipped += 1
+            return
+
+        started = time.perf_counter()
+        if player.message:
+            try:
+                await player.message.edit(embed=embed, view=view)
+                self.edits += 1
+            except discord.HTTPException as e:
+                if e.status == 429:
+                    self._rate_limited(player.channel.id, e)
+                    self.request(guild_id, player)
+                    return
+                player.message = await player.channel.send(embed=embed, view=view)
+                self.sends += 1
+        else:
+            player.message = await player.channel.send(embed=embed, view=view)
+            self.sends += 1
+        self.last_latency = time.perf_counter() - started
+        metrics.EMBED_EDIT_SECONDS.observe(self.last_latency)
+        self._fingerprints[guild_id] = fingerprint
+
+    def _rate_limited(self, channel_id, error):
+        self.rate_limited += 1
+        metrics.EMBED_RATE_LIMITED.inc()
+        retry_after = 1.0
+        response = getattr(error, "response", None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get("Retry-After", retry_after))
+            except (TypeError, ValueError):
+                pass
+        bucket = self._buckets[channel_id]
+        bucket.blocked_until = time.monotonic() + retry_after
+        logger.info(f"Embed edits rate limited in channel {channel_id} for {retry_after}s")
@@ -0,0 +1,390 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import threading
+import time
+
+import discord
+
+from utils import metrics
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger("music.ffmpeg")
+
+FRAME_SECONDS = discord.opus.Encoder.FRAME_LENGTH / 1000
+PCM_SILENCE = b"\0" * discord.opus.Encoder.FRAME_SIZE
+OPUS_SILENCE = b"\xf8\xff\xfe"
+
+
+class DecoderBusy(Exception):
+    """Raised when the per-host ffmpeg cap is reached."""
+
+
+class _Slot:
+    __slots__ = ("slots", "index", "fd")
+
+    def __init__(self, slots, index, fd):
+        self.slots = slots
+        self.index = index
+        self.fd = fd
+
+    def release(self):
+        if self.slots is not None:
+            self.slots._release(self)
+            self.slots = None
+
+
+class DecoderSlots:
+    """Per-host cap on concurrent ffmpeg processes.
+
+    Each slot is a lock file under ``directory`` held with ``flock``, so
+    every bot process on the host shares the same limit and a crashed
+    process gives its slots back automatically. Without ``fcntl`` the cap
+    only applies to this process.
+    """
+
+    def __init__(self, directory, limit):
+        self.directory = directory
+        self.limit = limit
+        self.held = 0
+        self._lock = threading.Lock()
+        if limit > 0 and fcntl is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def try_acquire(self):
+        if self.limit <= 0:
+            return _Slot(None, -1, None)
+        if fcntl is None:
+            with self._lock:
+                if self.held >= self.limit:
+                    return None
+                self.held += 1
+            return _Slot(self, -1, None)
+
+        start = random.randrange(self.limit)
+        for offset in range(self.limit):
+            index = (start + offset) % self.limit
+            path = os.path.join(self.directory, f"slot-{index}.lock")
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                continue
+            with self._lock:
+                self.held += 1
+            return _Slot(self, index, fd)
+        return None
+
+    def _release(self, slot):
+        with self._lock:
+            self.held -= 1
+        if slot.fd is not None:
+            # ปิด fd แล้ว flock จะถูกปล่อยเอง
+            os.close(slot.fd)
+
+
+class SupervisedSource(discord.AudioSource):
+    """An ffmpeg source that survives its process dying mid-track.
+
+    When the stream ends well before the track's duration (or the
+    watchdog kills a stalled process), the source plays silence while
+    the supervisor reopens the track at the last played offset, then
+    swaps the new process in without stopping the voice player.
+    """
+
+    def __init__(self, supervisor, source, track, guild_id, seek, slot, transcode):
+        self.supervisor = supervisor
+        self.track = track
+        self.guild_id = guild_id
+        self.seek = seek
+        self.transcode = transcode
+        self.frames = 0
+        self.restarts = 0
+        self.read_started = None
+        self._source = source
+        self._slot = slot
+        self._opus = source.is_opus()
+        self._silence = OPUS_SILENCE if self._opus else PCM_SILENCE
+        self._lock = threading.Lock()
+        self._recovering = False
+        self._waited = 0
+        self._closed = False
+
+    @property
+    def position(self):
+        return self.seek + self.frames * FRAME_SECONDS
+
+    @property
+    def process(self):
+        return getattr(self._source, "_process", None)
+
+    @property
+    def recovering(self):
+        return self._recovering
+
+    def is_opus(self):
+        return self._opus
+
+    def read(self):
+        if self._recovering:
+            self._waited += 1
+            if self._waited > self.supervisor.recover_frames:
+                return b""
+            return self._silence
+
+        source = self._source
+        self.read_started = time.monotonic()
+        try:
+            data = source.read()
+        except (OSError, ValueError):
+            data = b""
+        finally:
+            self.read_started = None
+        if data:
+            self.frames += 1
+            return data
+        if self._should_recover():
+            self._recovering = True
+            self._waited = 0
+            self.supervisor.recover(self)
+            return self._silence
+        return b""
+
+    def _should_recover(self):
+        duration = self.track.duration
+        return (
+            not self._closed
+            and self.restarts < self.supervisor.max_restarts
+            and bool(duration)
+            and self.position < duration - self.supervisor.end_tolerance
+        )
+
+    def kill(self):
+        kill = getattr(self._source, "kill", None)
+        if kill is not None:
+            # stream จาก audio node ไม่มี process ในเครื่องนี้
+            kill()
+            return
+        process = self.process
+        if process is not None and process.poll() is None:
+            process.kill()
+
+    def configure(self, **params):
+        configure = getattr(self._source, "configure", None)
+        if configure is not None:
+            configure(**params)
+
+    def replace(self, source):
+        with self._lock:
+            if self._closed:
+                old = source
+            else:
+                old, self._source = self._source, source
+                self.restarts += 1
+            self._recovering = False
+        old.cleanup()
+
+    def give_up(self):
+        # ให้ read คืน b"" ในเฟรมถัดไปเพื่อข้ามไปเพลงถัดไป
+        self._waited = self.supervisor.recover_frames
+
+    def cleanup(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._source.cleanup()
+        self._slot.release()
+        self.supervisor.forget(self)
+
+
+class FFmpegSupervisor:
+    """Registry and watchdog for every ffmpeg process the cog starts.
+
+    ``reopen(source)`` is a coroutine from the cog that returns a fresh
+    ffmpeg source for ``source.track`` starting at ``source.position``.
+    One-shot children such as ffprobe and audio cache fills go through
+    ``run``, which holds a decoder slot and keeps them in ``processes``.
+    """
+
+    def __init__(
+        self,
+        reopen,
+        slots,
+        stall_seconds=5.0,
+        max_restarts=3,
+        recover_timeout=15.0,
+        end_tolerance=3.0,
+        slot_wait=10.0,
+    ):
+        self.reopen = reopen
+        self.slots = slots
+        self.stall_seconds = stall_seconds
+        self.max_restarts = max_restarts
+        self.recover_frames = int(recover_timeout / FRAME_SECONDS)
+        self.end_tolerance = end_tolerance
+        self.slot_wait = slot_wait
+        self.sources = set()
+        self.processes = {}  # process -> guild_id (None = งานของทั้ง host)
+        self.guilds = {}  # guild_id -> sources ของ guild นั้น
+        self.loop = None
+        self._task = None
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._watchdog())
+
+    def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for source in list(self.sources):
+            source.cleanup()
+        for process in list(self.processes):
+            self._kill(process)
+
+    def supervise(self, source, track, guild_id, seek, slot, transcode):
+        supervised = SupervisedSource(self, source, track, guild_id, seek, slot, transcode)
+        self.sources.add(supervised)
+        self.guilds.setdefault(guild_id, set()).add(supervised)
+        return supervised
+
+    def forget(self, source):
+        self.sources.discard(source)
+        sources = self.guilds.get(source.guild_id)
+        if sources is not None:
+            sources.discard(source)
+            if not sources:
+                del self.guilds[source.guild_id]
+
+    def position(self, guild_id, track):
+        """Frame-counted position of ``track`` in a guild, or None without a live source."""
+        for source in list(self.guilds.get(guild_id, ())):
+            if source.track is track and (source.frames or source.seek):
+                return source.position
+        return None
+
+    def live_count(self):
+        count = 0
+        for source in list(self.sources):
+            process = source.process
+            if process is not None and process.poll() is None:
+                count += 1
+        return count + len(self.processes)
+
+    def configure(self, guild_id, **params):
+        for source in list(self.guilds.get(guild_id, ())):
+            source.configure(**params)
+
+    def reap(self, guild_id):
+        """Clean up every source left behind by a guild, returns how many."""
+        sources = list(self.guilds.get(guild_id, ()))
+        for source in sources:
+            source.cleanup()
+        processes = [p for p, owner in self.processes.items() if owner == guild_id]
+        for process in processes:
+            self._kill(process)
+        return len(sources) + len(processes)
+
+    async def acquire(self, wait=None):
+        """Wait up to ``wait`` seconds (default ``slot_wait``) for a decoder slot."""
+        deadline = time.monotonic() + (self.slot_wait if wait is None else wait)
+        while True:
+            slot = self.slots.try_acquire()
+            if slot is not None:
+                return slot
+            if time.monotonic() >= deadline:
+                raise DecoderBusy("Too many ffmpeg processes on this host")
+            await asyncio.sleep(0.25)
+
+    async def run(self, args, guild_id=None, wait=None, **kwargs):
+        """Run a one-shot child under a decoder slot, returns (returncode, stdout, stderr)."""
+        slot = await self.acquire(wait)
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *args,
+                stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                **kwargs,
+            )
+        except Exception:
+            slot.release()
+            raise
+        self.processes[process] = guild_id
+        try:
+            stdout, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            self._kill(process)
+            raise
+        finally:
+            self.processes.pop(process, None)
+            slot.release()
+        return process.returncode, stdout, stderr
+
+    async def probe_codec(self, url, guild_id=None):
+        """Audio codec name of ``url`` from ffprobe, like FFmpegOpusAudio.probe."""
+        returncode, stdout, stderr = await self.run(
+            [
+                "ffprobe",
+                "-v",
+                "quiet",
+                "-print_format",
+                "json",
+                "-show_streams",
+                "-select_streams",
+                "a:0",
+                url,
+            ],
+            guild_id=guild_id,
+        )
+        if returncode != 0:
+            raise RuntimeError(f"ffprobe exited with {returncode}")
+        streams = json.loads(stdout or b"{}").get("streams") or [{}]
+        return streams[0].get("codec_name")
+
+    def _kill(self, process):
+        if process.returncode is None:
+            try:
+                process.kill()
+            except ProcessLookupError:
+                pass
+
+    def recover(self, source):
+        # เรียกจาก thread ของ voice player
+        asyncio.run_coroutine_threadsafe(self._recover(source), self.loop)
+
+    async def _recover(self, source):
+        logger.info(
+            f"Restarting ffmpeg for {source.track} at {source.position:.1f}s"
+            f" in guild {source.guild_id}"
+        )
+        metrics.FFMPEG_RESTARTS.inc()
+        try:
+            replacement = await self.reopen(source)
+        except Exception as e:
+            logger.warning(f"Could not restart {source.track}: {e}")
+            source.give_up()
+            return
+        source.replace(replacement)
+
+    async def _watchdog(self):
+        while True:
+            await asyncio.sleep(1)
+            now = time.monotonic()
+            for source in list(self.sources):
+                started = source.read_started
+                if started is not None and now - started > self.stall_seconds:
+                    # ffmpeg ไม่ส่งข้อมูลมานานเกินไป ฆ่า process เพื่อให้ read กลับมาแล้วเริ่มใหม่
+                    logger.warning(f"ffmpeg stalled on {source.track}, restarting")
+                    metrics.FFMPEG_STALLS.inc()
+                    source.read_started = None
+                    source.kill()
@@ -0,0 +1,101 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+
+logger = logging.getLogger("music.idle")
+
+
+class IdleTimers:
+    """Keyed one-shot timers on a deadline heap, driven by a single task.
+
+    ``schedule`` replaces any pending deadline for the same key and
+    ``cancel`` is O(1): stale heap entries are skipped when they surface
+    and the heap is rebuilt once they outnumber the live timers. Each wake
+    up only touches expired entries, and ``on_expire(key)`` is started as
+    its own task so a slow Discord call cannot delay other timers.
+    """
+
+    def __init__(self, on_expire):
+        self.on_expire = on_expire
+        self.expired = 0
+        self._heap = []
+        self._deadlines = {}
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._running = set()
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, key):
+        return key in self._deadlines
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def close(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for task in self._running:
+            task.cancel()
+
+    def schedule(self, key, delay):
+        deadline = time.monotonic() + delay
+        entry = (deadline, next(self._counter))
+        self._deadlines[key] = entry
+        heapq.heappush(self._heap, (*entry, key))
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._compact()
+        if self._heap[0][2] == key:
+            self._wakeup.set()
+
+    def cancel(self, key):
+        self._deadlines.pop(key, None)
+
+    def remaining(self, key):
+        entry = self._deadlines.get(key)
+        return None if entry is None else max(0.0, entry[0] - time.monotonic())
+
+    def _compact(self):
+        self._heap = [(*entry, key) for key, entry in self._deadlines.items()]
+        heapq.heapify(self._heap)
+
+    def _pop_expired(self, now):
+        expired = []
+        heap = self._heap
+        while heap:
+            deadline, seq, key = heap[0]
+            if self._deadlines.get(key) != (deadline, seq):
+                heapq.heappop(heap)
+                continue
+            if deadline > now:
+                break
+            heapq.heappop(heap)
+            del self._deadlines[key]
+            expired.append(key)
+        return expired
+
+    async def _run(self):
+        while True:
+            for key in self._pop_expired(time.monotonic()):
+                self.expired += 1
+                task = asyncio.create_task(self._fire(key))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+            self._wakeup.clear()
+            timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, key):
+        try:
+            await self.on_expire(key)
+        except Exception as e:
+            logger.warning(f"Idle timer {key} failed: {e}")
@@ -0,0 +1,178 @@
+import asyncio
+import time
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    return "{" + inner + "}"
+
+
+class Counter:
+    __slots__ = ("name", "help", "value")
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        yield f"{self.name} {self.value}"
+
+
+class Gauge:
+    __slots__ = ("name", "help", "value")
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {self.value}"
+
+
+class Histogram:
+    __slots__ = ("name", "help", "buckets", "counts", "sum", "count")
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        # ไม่ใช้ lock: ค่าอาจคลาดเคลื่อนเล็กน้อยเมื่อเรียกจากหลาย thread พร้อมกัน
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{self.name}_bucket{{le="{bound}"}} {cumulative}'
+        yield f'{self.name}_bucket{{le="+Inf"}} {self.count}'
+        yield f"{self.name}_sum {self.sum}"
+        yield f"{self.name}_count {self.count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help):
+        metric = Counter(name, help)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help):
+        metric = Gauge(name, help)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help, buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """Register ``fn() -> iterable of (name, type, help, [(labels, value)])``."""
+        self._collectors.append(fn)
+        return fn
+
+    def unregister_collector(self, fn):
+        if fn in self._collectors:
+            self._collectors.remove(fn)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, kind, help, samples in collect():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+RESOLVE_SECONDS = registry.histogram(
+    "music_resolve_seconds", "Time spent in yt-dlp extraction per lookup"
+)
+TRACK_GAP_SECONDS = registry.histogram(
+    "music_track_gap_seconds", "Time from a track ending to the next one starting"
+)
+EMBED_EDIT_SECONDS = registry.histogram(
+    "music_embed_edit_seconds", "Latency of now-playing message edits"
+)
+EMBED_RATE_LIMITED = registry.counter(
+    "music_embed_rate_limited_total", "Now-playing edits rejected with HTTP 429"
+)
+SEARCH_SECONDS = registry.histogram(
+    "music_search_seconds", "Time spent in flat yt-dlp searches"
+)
+VOICE_CONNECT_SECONDS = registry.histogram(
+    "music_voice_connect_seconds", "Time spent opening voice connections"
+)
+VOICE_REUSED = registry.counter(
+    "music_voice_reused_total", "Requests served by an already connected voice client"
+)
+MESSAGES = registry.counter("music_messages_total", "Messages handled in music rooms")
+TRACKS_STARTED = registry.counter("music_tracks_started_total", "Tracks started")
+RESOLVE_ERRORS = registry.counter("music_resolve_errors_total", "Failed lookups")
+LOOP_LAG_SECONDS = registry.histogram(
+    "music_event_loop_lag_seconds",
+    "Event loop scheduling delay",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+)
+LOOP_LAG = registry.gauge("music_event_loop_lag_last_seconds", "Last event loop delay")
+FFMPEG_RESTARTS = registry.counter(
+    "music_ffmpeg_restarts_total", "ffmpeg processes reopened mid-track"
+)
+FFMPEG_STALLS = registry.counter(
+    "music_ffmpeg_stalls_total", "ffmpeg processes killed for not producing frames"
+)
+AUDIO_NODE_RESTARTS = registry.counter(
+    "music_audio_node_restarts_total", "Audio node workers restarted after being lost"
+)
+DSP_FRAME_SECONDS = registry.histogram(
+    "music_dsp_frame_seconds",
+    "CPU time spent on DSP per 20 ms output frame",
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02),
+)
+
+
+async def monitor_loop_lag(interval=0.5):
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - started - interval)
+        LOOP_LAG_SECONDS.observe(lag)
+        LOOP_LAG.set(lag)
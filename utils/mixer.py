@@ -0,0 +1,202 @@
+import logging
+import threading
+
+import discord
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger("music.mixer")
+
+FRAME_BYTES = discord.opus.Encoder.FRAME_SIZE
+SAMPLES_PER_FRAME = discord.opus.Encoder.SAMPLES_PER_FRAME
+CHANNELS = discord.opus.Encoder.CHANNELS
+FRAME_SECONDS = discord.opus.Encoder.FRAME_LENGTH / 1000
+SILENCE = b"\0" * FRAME_BYTES
+
+
+class _Deck:
+    __slots__ = ("source", "track", "stage", "frames", "total_frames")
+
+    def __init__(self, source, track, stage=None):
+        self.source = source
+        self.track = track
+        self.stage = stage
+        self.frames = 0
+        duration = track.duration or 0
+        self.total_frames = int(duration / FRAME_SECONDS) if duration else 0
+
+    @property
+    def remaining(self):
+        if not self.total_frames:
+            return None
+        return self.total_frames - self.frames
+
+    def read(self):
+        try:
+            data = self.source.read()
+        except (OSError, ValueError):
+            # source ถูก cleanup ไปแล้วระหว่างอ่าน
+            return b""
+        if data:
+            self.frames += 1
+            if len(data) < FRAME_BYTES:
+                data += b"\0" * (FRAME_BYTES - len(data))
+            if self.stage is not None:
+                data = self.stage.process(data)
+        return data
+
+    def close(self):
+        if self.stage is not None:
+            self.stage.close()
+            self.stage = None
+        self.source.cleanup()
+
+
+class MixerSource(discord.AudioSource):
+    """Continuous PCM source that plays a guild's tracks back to back.
+
+    The current and the next track are both held as decks. When the
+    current deck runs out the next one is promoted inside ``read`` without
+    stopping the voice player; with ``crossfade`` > 0 and NumPy available
+    the last seconds of the current track are mixed with the start of the
+    next using an equal-power fade.
+
+    ``on_advance(track)`` is called from the player thread whenever a new
+    track becomes current.
+    """
+
+    def __init__(self, on_advance, crossfade=0.0, wait_timeout=10.0):
+        self.on_advance = on_advance
+        self.fade_frames = int(crossfade / FRAME_SECONDS) if np is not None else 0
+        if crossfade and np is None:
+            logger.warning("NumPy is not installed, crossfade disabled")
+        self.wait_frames = int(wait_timeout / FRAME_SECONDS)
+        self._lock = threading.Lock()
+        self._current = None
+        self._next = None
+        self._expecting = False
+        self._waited = 0
+        self._fading = 0
+
+    def is_opus(self):
+        return False
+
+    @property
+    def position(self):
+        deck = self._current
+        return deck.frames * FRAME_SECONDS if deck else 0.0
+
+    @property
+    def next_track(self):
+        deck = self._next
+        return deck.track if deck else None
+
+    def start(self, source, track, stage=None):
+        with self._lock:
+            self._current = _Deck(source, track, stage)
+
+    def expect_next(self):
+        self._expecting = True
+
+    def set_next(self, source, track, stage=None):
+        with self._lock:
+            old, self._next = self._next, _Deck(source, track, stage)
+            self._expecting = False
+        if old is not None:
+            old.close()
+
+    def clear_next(self):
+        with self._lock:
+            old, self._next = self._next, None
+            self._expecting = False
+        if old is not None:
+            old.close()
+            return old.track
+        return None
+
+    def skip(self):
+        with self._lock:
+            deck, self._current = self._current, None
+            self._fading = 0
+        if deck is not None:
+            deck.close()
+
+    def _promote(self):
+        # เรียกภายใต้ lock
+        self._current, self._next = self._next, None
+        self._fading = 0
+        self._waited = 0
+        if self._current is not None:
+            self.on_advance(self._current.track)
+
+    def _mix(self, out_frame, in_frame):
+        start = self._fading / self.fade_frames
+        end = (self._fading + 1) / self.fade_frames
+        ramp = np.linspace(start, min(end, 1.0), SAMPLES_PER_FRAME, endpoint=False)
+        ramp = np.repeat(ramp * (np.pi / 2), CHANNELS)
+        a = np.frombuffer(out_frame, dtype=np.int16).astype(np.float32)
+        b = np.frombuffer(in_frame, dtype=np.int16).astype(np.float32)
+        mixed = a * np.cos(ramp) + b * np.sin(ramp)
+        return np.clip(mixed, -32768, 32767).astype(np.int16).tobytes()
+
+    def _fade_partner(self, current):
+        if not self.fade_frames or self._next is None:
+            return None
+        remaining = current.remaining
+        if remaining is None or remaining > self.fade_frames:
+            return None
+        return self._next
+
+    def read(self):
+        # อ่าน ffmpeg นอก lock เพื่อไม่ให้ set_next จาก event loop ต้องรอ pipe
+        with self._lock:
+            if self._current is None:
+                if self._next is None:
+                    return SILENCE if self._wait() else b""
+                self._promote()
+            current = self._current
+            incoming_deck = self._fade_partner(current)
+
+        data = current.read()
+        incoming = incoming_deck.read() if data and incoming_deck else None
+
+        with self._lock:
+            if self._current is not current:
+                # ถูก skip ระหว่างอ่าน
+                return data or SILENCE
+            promoted = None
+            if not data:
+                current.close()
+                self._current = None
+                if self._next is None:
+                    return SILENCE if self._wait() else b""
+                self._promote()
+                promoted = self._current
+            elif incoming and incoming_deck is self._next:
+                data = self._mix(data, incoming)
+                self._fading += 1
+                if self._fading >= self.fade_frames:
+                    current.close()
+                    self._promote()
+
+        if promoted is not None:
+            return promoted.read() or SILENCE
+        return data
+
+    def _wait(self):
+        # รอ track ถัดไปที่กำลังเตรียมอยู่ โดยส่งเสียงเงียบแทนการหยุดเล่น
+        if self._expecting and self._waited < self.wait_frames:
+            self._waited += 1
+            return True
+        return False
+
+    def cleanup(self):
+        with self._lock:
+            decks = (self._current, self._next)
+            self._current = self._next = None
+        for deck in decks:
+            if deck is not None:
+                deck.close()
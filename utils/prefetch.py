@@ -0,0 +1,90 @@
+import asyncio
+import logging
+import random
+from itertools import islice
+
+from config.settings import settings
+from utils.ffmpeg import DecoderBusy
+
+logger = logging.getLogger("music.prefetch")
+
+
+class Prefetcher:
+    """Resolves the next few queue entries of one guild while a song plays."""
+
+    def __init__(self, cog, guild_id, depth=None):
+        self.cog = cog
+        self.guild_id = guild_id
+        self.depth = depth if depth is not None else settings.PREFETCH_DEPTH
+        self.task = None
+        self.warm = None  # track ที่มี ffmpeg เปิดรอไว้
+
+    def schedule(self):
+        if self.depth <= 0:
+            return
+        if self.task and not self.task.done():
+            self.task.cancel()
+        self.task = asyncio.create_task(self._run())
+
+    def cancel(self):
+        if self.task and not self.task.done():
+            self.task.cancel()
+        self.task = None
+
+    def commit_shuffle(self, player):
+        # ในโหมด shuffle เลือกเพลงถัดไปไว้ล่วงหน้า แล้วย้ายไปไว้หัวคิว
+        if not player.shuffle or player.next_committed or not player.queue:
+            return
+        index = random.randrange(len(player.queue))
+        if index:
+            player.queue.move(index, 0)
+        player.next_committed = True
+
+    def check_head(self, player):
+        """Release the warm source once its track is no longer next in the queue."""
+        track = self.warm
+        if track is None or (player.queue and player.queue[0] is track):
+            return
+        self.warm = None
+        # ถ้าเพลงนี้ถูกเล่นไปแล้ว take_source เอา source ออกไปก่อน release จึงไม่ทำอะไร
+        track.release()
+
+    async def _run(self):
+        player = self.cog.players.get(self.guild_id)
+        if player is None:
+            return
+        self.commit_shuffle(player)
+        self.check_head(player)
+
+        for track in list(islice(player.queue, self.depth)):
+            if self.cog.is_cached(track):
+                continue
+            if not track.is_stale(margin=settings.PREFETCH_MARGIN):
+                continue
+            try:
+                info = await self.cog.lookup(self.guild_id, track.source_query)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.info(f"Prefetch failed for {track}: {e}")
+                continue
+            track.update(info)
+
+        if settings.PREFETCH_WARM_SOURCE and player.queue:
+            head = player.queue[0]
+            if head.warm_source is None and (
+                self.cog.is_cached(head) or not head.is_stale()
+            ):
+                try:
+                    head.warm_source = self.cog.build_source(head, guild_id=self.guild_id)
+                    self.warm = head
+                except DecoderBusy:
+                    logger.info(f"No free ffmpeg slot to warm {head}")
+
+    def release(self, player):
+        self.cancel()
+        if self.warm is not None:
+            self.warm.release()
+            self.warm = None
+        for track in player.queue:
+            track.release()
@@ -0,0 +1,130 @@
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("music.resolver")
+
+
+class ResolverBusy(Exception):
+    pass
+
+
+class _Job:
+    __slots__ = ("fn", "args", "owner", "future")
+
+    def __init__(self, fn, args, owner, future):
+        self.fn = fn
+        self.args = args
+        self.owner = owner
+        self.future = future
+
+
+class ResolverScheduler:
+    """Fixed-size worker pool for blocking lookups, shared fairly between guilds.
+
+    Each guild has its own pending queue and may have at most
+    ``per_guild_limit`` lookups running at once; free workers are handed
+    out to guilds in round-robin order.
+    """
+
+    def __init__(self, workers=4, per_guild_limit=2, max_pending=25):
+        self.workers = workers
+        self.per_guild_limit = per_guild_limit
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="resolver"
+        )
+        self.running = 0
+        self._pending = {}
+        self._in_flight = {}
+        self._rotation = deque()
+
+    @property
+    def saturated(self):
+        return self.running >= self.workers
+
+    def pending_count(self, guild_id=None):
+        if guild_id is not None:
+            return len(self._pending.get(guild_id, ()))
+        return sum(len(queue) for queue in self._pending.values())
+
+    async def submit(self, guild_id, fn, *args, owner=None):
+        queue = self._pending.setdefault(guild_id, deque())
+        if len(queue) >= self.max_pending:
+            raise ResolverBusy(f"{len(queue)} lookups already pending")
+
+        job = _Job(fn, args, owner, asyncio.get_running_loop().create_future())
+        queue.append(job)
+        if guild_id not in self._rotation:
+            self._rotation.append(guild_id)
+        self._pump()
+        return await job.future
+
+    def cancel(self, guild_id=None, owner=None):
+        cancelled = 0
+        for gid, queue in list(self._pending.items()):
+            if guild_id is not None and gid != guild_id:
+                continue
+            for job in list(queue):
+                if owner is None or job.owner == owner:
+                    job.future.cancel()
+                    queue.remove(job)
+                    cancelled += 1
+            if not queue:
+                del self._pending[gid]
+        if cancelled:
+            logger.info(f"Cancelled {cancelled} pending lookups")
+        return cancelled
+
+    def _next_job(self):
+        for _ in range(len(self._rotation)):
+            guild_id = self._rotation.popleft()
+            queue = self._pending.get(guild_id)
+            while queue and queue[0].future.done():
+                queue.popleft()
+            if not queue:
+                self._pending.pop(guild_id, None)
+                continue
+            if self._in_flight.get(guild_id, 0) >= self.per_guild_limit:
+                self._rotation.append(guild_id)
+                continue
+            job = queue.popleft()
+            if queue:
+                self._rotation.append(guild_id)
+            else:
+                del self._pending[guild_id]
+            return guild_id, job
+        return None, None
+
+    def _pump(self):
+        loop = asyncio.get_running_loop()
+        while self.running < self.workers:
+            guild_id, job = self._next_job()
+            if job is None:
+                return
+            self.running += 1
+            self._in_flight[guild_id] = self._in_flight.get(guild_id, 0) + 1
+            future = self.executor.submit(job.fn, *job.args)
+            future.add_done_callback(
+                lambda f, g=guild_id, j=job: loop.call_soon_threadsafe(
+                    self._finish, g, j, f
+                )
+            )
+
+    def _finish(self, guild_id, job, future):
+        self.running -= 1
+        self._in_flight[guild_id] -= 1
+        if not self._in_flight[guild_id]:
+            del self._in_flight[guild_id]
+        if not job.future.done():
+            error = future.exception()
+            if error is not None:
+                job.future.set_exception(error)
+            else:
+                job.future.set_result(future.result())
+        self._pump()
+
+    def shutdown(self):
+        self.cancel()
+        self.executor.shutdown(wait=False, cancel_futures=True)
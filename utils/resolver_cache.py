@@ -0,0 +1,147 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlparse
+
+_YOUTUBE_HOSTS = ("youtube.com", "www.youtube.com", "m.youtube.com", "music.youtube.com")
+_EXPIRE_PATH = re.compile(r"/expire/(\d+)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def stream_expiry(url):
+    """Return the unix time at which a signed stream URL stops working, if known."""
+    if not url:
+        return None
+    parsed = urlparse(url)
+    expire = parse_qs(parsed.query).get("expire")
+    if expire:
+        try:
+            return float(expire[0])
+        except ValueError:
+            return None
+    match = _EXPIRE_PATH.search(parsed.path)
+    if match:
+        return float(match.group(1))
+    return None
+
+
+def youtube_video_id(query):
+    parsed = urlparse(query.strip())
+    host = parsed.netloc.lower()
+    if host == "youtu.be":
+        return parsed.path.lstrip("/").split("/")[0] or None
+    if host in _YOUTUBE_HOSTS:
+        if parsed.path == "/watch":
+            return parse_qs(parsed.query).get("v", [None])[0]
+        if parsed.path.startswith(("/shorts/", "/live/")):
+            return parsed.path.split("/")[2] or None
+    return None
+
+
+def youtube_playlist_id(query):
+    parsed = urlparse(query.strip())
+    if parsed.netloc.lower() in _YOUTUBE_HOSTS and parsed.path == "/playlist":
+        return parse_qs(parsed.query).get("list", [None])[0]
+    return None
+
+
+def normalize_query(query):
+    video_id = youtube_video_id(query)
+    if video_id:
+        return f"id:{video_id}"
+    return _WHITESPACE.sub(" ", query.strip()).lower()
+
+
+class ResolverCache:
+    """Thread-safe LRU of resolved track info, shared by every guild.
+
+    Entries are stored once per video id; normalized queries are aliases
+    that point at a video id. An entry expires at the ``expire=`` timestamp
+    of its stream URL (minus ``margin``), or after ``default_ttl`` when the
+    URL carries no expiry.
+    """
+
+    def __init__(self, max_size=1024, default_ttl=3600, margin=120):
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.margin = margin
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._aliases = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _lookup(self, video_id, now):
+        entry = self._entries.get(video_id)
+        if entry is None:
+            return None
+        info, expires_at = entry
+        if expires_at <= now:
+            del self._entries[video_id]
+            return None
+        self._entries.move_to_end(video_id)
+        return info
+
+    def get(self, query):
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            video_id = self._aliases.get(key)
+            if video_id is None and key.startswith("id:"):
+                video_id = key[3:]
+            info = self._lookup(video_id, now) if video_id else None
+            if info is None:
+                self._aliases.pop(key, None)
+                self.misses += 1
+                return None
+            self._aliases[key] = video_id
+            self._aliases.move_to_end(key)
+            self.hits += 1
+            return info
+
+    def get_by_id(self, video_id):
+        with self._lock:
+            info = self._lookup(video_id, time.time())
+            if info is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return info
+
+    def put(self, query, info):
+        video_id = info.get("id")
+        if not video_id:
+            return info
+        expires_at = stream_expiry(info.get("url"))
+        if expires_at is None:
+            expires_at = time.time() + self.default_ttl
+        expires_at -= self.margin
+        with self._lock:
+            self._entries[video_id] = (info, expires_at)
+            self._entries.move_to_end(video_id)
+            if query is not None:
+                self._aliases[normalize_query(query)] = video_id
+                self._aliases.move_to_end(normalize_query(query))
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            while len(self._aliases) > self.max_size * 4:
+                self._aliases.popitem(last=False)
+        return info
+
+    def invalidate(self, video_id):
+        with self._lock:
+            self._entries.pop(video_id, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
@@ -0,0 +1,103 @@
+import bisect
+import itertools
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_title(text):
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return " ".join(text.split())
+
+
+class SearchCache:
+    """LRU of flat search results keyed by normalized query, with a TTL.
+
+    Flat results carry no stream URLs, so they stay valid far longer than
+    resolver entries; the TTL only bounds how stale rankings can get.
+    """
+
+    def __init__(self, max_size=1000, ttl=3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, query):
+        key = normalize_title(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self._entries.pop(key, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, query, results):
+        key = normalize_title(query)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, results)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return results
+
+
+class TitleIndex:
+    """Prefix index over titles of previously played tracks.
+
+    Every word start of a normalized title is kept in one sorted list, so
+    a prefix lookup is a bisect plus a scan over the matches. Titles are
+    evicted least recently played first once ``max_titles`` is exceeded.
+    """
+
+    def __init__(self, max_titles=5000):
+        self.max_titles = max_titles
+        self._titles = OrderedDict()  # url -> title
+        self._keys = []  # (suffix, url) เรียงตามตัวอักษร
+
+    def __len__(self):
+        return len(self._titles)
+
+    def _suffixes(self, title):
+        words = normalize_title(title).split(" ")
+        return {" ".join(words[index:]) for index in range(len(words))}
+
+    def add(self, title, url):
+        if not title or not url:
+            return
+        if url in self._titles:
+            self._titles.move_to_end(url)
+            return
+        self._titles[url] = title
+        for suffix in self._suffixes(title):
+            bisect.insort(self._keys, (suffix, url))
+        while len(self._titles) > self.max_titles:
+            old_url, old_title = self._titles.popitem(last=False)
+            for suffix in self._suffixes(old_title):
+                index = bisect.bisect_left(self._keys, (suffix, old_url))
+                if index < len(self._keys) and self._keys[index] == (suffix, old_url):
+                    del self._keys[index]
+
+    def complete(self, prefix, limit=25):
+        prefix = normalize_title(prefix)
+        if not prefix:
+            urls = itertools.islice(reversed(self._titles), limit)
+            return [(self._titles[url], url) for url in urls]
+        results = []
+        seen = set()
+        index = bisect.bisect_left(self._keys, (prefix, ""))
+        while index < len(self._keys) and len(results) < limit:
+            suffix, url = self._keys[index]
+            if not suffix.startswith(prefix):
+                break
+            if url not in seen and url in self._titles:
+                seen.add(url)
+                results.append((self._titles[url], url))
+            index += 1
+        return results
@@ -0,0 +1,85 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger("bot.startup")
+
+
+class StartupTimer:
+    """Wall-clock duration of each boot phase, reported once the bot is ready.
+
+    ``mark(name)`` closes the phase that ran since the previous mark.
+    Work that overlaps other phases, such as background warm-ups, is
+    added with ``record(name, seconds)`` and left out of the total.
+    Marks after the report (reconnects firing on_ready again) are ignored.
+    """
+
+    def __init__(self, started=None):
+        self.started = started if started is not None else time.perf_counter()
+        self.phases = []
+        self.background = []
+        self.reported = False
+        self._last = self.started
+
+    def mark(self, name):
+        if self.reported:
+            return
+        now = time.perf_counter()
+        self.phases.append((name, now - self._last))
+        self._last = now
+
+    def record(self, name, seconds):
+        self.background.append((name, seconds))
+        logger.info(f"Startup: {name} took {seconds:.2f}s in the background")
+
+    @property
+    def total(self):
+        return self._last - self.started
+
+    def report(self):
+        if self.reported:
+            return
+        self.reported = True
+        phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.phases)
+        logger.info(f"Startup: {phases} (total {self.total:.2f}s)")
+
+    def collect_metrics(self):
+        samples = [({"phase": name}, seconds) for name, seconds in self.phases]
+        samples += [({"phase": name}, seconds) for name, seconds in self.background]
+        yield (
+            "music_startup_phase_seconds",
+            "gauge",
+            "Seconds spent in each startup phase",
+            samples,
+        )
+
+
+def command_tree_hash(tree, application_id):
+    """Stable hash of the global app-command payload Discord would receive."""
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands()),
+        key=lambda command: command["name"],
+    )
+    data = json.dumps([application_id, payload], sort_keys=True, default=str)
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def read_tree_hash(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def write_tree_hash(path, digest):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # เขียนไฟล์ชั่วคราวแล้ว rename เพื่อไม่ให้ได้ไฟล์ครึ่งๆ ถ้า process ตายกลางทาง
+    temp = f"{path}.tmp"
+    with open(temp, "w") as f:
+        f.write(digest)
+    os.replace(temp, path)
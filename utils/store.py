@@ -0,0 +1,172 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+
+logger = logging.getLogger("music.store")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rooms (
+    channel_id INTEGER PRIMARY KEY,
+    guild_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS players (
+    guild_id INTEGER PRIMARY KEY,
+    text_channel_id INTEGER,
+    voice_channel_id INTEGER,
+    current TEXT,
+    position REAL NOT NULL DEFAULT 0,
+    loop INTEGER NOT NULL DEFAULT 0,
+    shuffle INTEGER NOT NULL DEFAULT 0,
+    volume REAL NOT NULL DEFAULT 1.0
+);
+CREATE TABLE IF NOT EXISTS queue (
+    guild_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    track TEXT NOT NULL,
+    PRIMARY KEY (guild_id, position)
+);
+CREATE TABLE IF NOT EXISTS loudness (
+    video_id TEXT PRIMARY KEY,
+    lufs REAL NOT NULL
+);
+"""
+
+
+class StateBatch:
+    __slots__ = (
+        "rooms_added",
+        "rooms_removed",
+        "players",
+        "queues",
+        "positions",
+        "loudness",
+    )
+
+    def __init__(self):
+        self.rooms_added = []
+        self.rooms_removed = []
+        self.players = {}
+        self.queues = {}
+        self.positions = []
+        self.loudness = []
+
+    def __bool__(self):
+        return bool(
+            self.rooms_added
+            or self.rooms_removed
+            or self.players
+            or self.queues
+            or self.positions
+            or self.loudness
+        )
+
+
+class QueueStore:
+    """SQLite (WAL) snapshot of rooms, players, queues and loudness measurements.
+
+    All methods block and are meant to run off the event loop; writes are
+    applied one ``StateBatch`` per transaction.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def load(self):
+        with self._lock:
+            rooms = self._conn.execute("SELECT channel_id, guild_id FROM rooms").fetchall()
+            players = {}
+            for row in self._conn.execute(
+                "SELECT guild_id, text_channel_id, voice_channel_id, current,"
+                " position, loop, shuffle, volume FROM players"
+            ):
+                guild_id, text_id, voice_id, current, position, loop, shuffle, volume = row
+                players[guild_id] = {
+                    "text_channel_id": text_id,
+                    "voice_channel_id": voice_id,
+                    "current": json.loads(current) if current else None,
+                    "position": position,
+                    "loop": bool(loop),
+                    "shuffle": bool(shuffle),
+                    "volume": volume,
+                    "queue": [],
+                }
+            for guild_id, track in self._conn.execute(
+                "SELECT guild_id, track FROM queue ORDER BY guild_id, position"
+            ):
+                if guild_id in players:
+                    players[guild_id]["queue"].append(json.loads(track))
+        return rooms, players
+
+    def load_loudness(self):
+        with self._lock:
+            return self._conn.execute("SELECT video_id, lufs FROM loudness").fetchall()
+
+    def write(self, batch):
+        with self._lock:
+            conn = self._conn
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO rooms (channel_id, guild_id) VALUES (?, ?)",
+                    batch.rooms_added,
+                )
+                conn.executemany(
+                    "DELETE FROM rooms WHERE channel_id = ?",
+                    [(channel_id,) for channel_id in batch.rooms_removed],
+                )
+                for guild_id, row in batch.players.items():
+                    if row is None:
+                        conn.execute("DELETE FROM players WHERE guild_id = ?", (guild_id,))
+                        conn.execute("DELETE FROM queue WHERE guild_id = ?", (guild_id,))
+                        continue
+                    conn.execute(
+                        "INSERT OR REPLACE INTO players (guild_id, text_channel_id,"
+                        " voice_channel_id, current, position, loop, shuffle, volume)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (
+                            guild_id,
+                            row["text_channel_id"],
+                            row["voice_channel_id"],
+                            json.dumps(row["current"]) if row["current"] else None,
+                            row["position"],
+                            int(row["loop"]),
+                            int(row["shuffle"]),
+                            row["volume"],
+                        ),
+                    )
+                for guild_id, tracks in batch.queues.items():
+                    conn.execute("DELETE FROM queue WHERE guild_id = ?", (guild_id,))
+                    conn.executemany(
+                        "INSERT INTO queue (guild_id, position, track) VALUES (?, ?, ?)",
+                        [
+                            (guild_id, index, json.dumps(track))
+                            for index, track in enumerate(tracks)
+                        ],
+                    )
+                conn.executemany(
+                    "UPDATE players SET position = ? WHERE guild_id = ?",
+                    batch.positions,
+                )
+                conn.executemany(
+                    "INSERT OR REPLACE INTO loudness (video_id, lufs) VALUES (?, ?)",
+                    batch.loudness,
+                )
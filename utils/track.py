@@ -0,0 +1,129 @@
+import time
+
+from config.settings import settings
+from utils.resolver_cache import stream_expiry
+
+
+SAVED_FIELDS = (
+    "query",
+    "video_id",
+    "title",
+    "url",
+    "webpage_url",
+    "duration",
+    "thumbnail",
+    "uploader",
+    "view_count",
+    "acodec",
+    "asr",
+    "expires_at",
+)
+
+
+class Track:
+    __slots__ = (
+        "query",
+        "requester_id",
+        "video_id",
+        "title",
+        "url",
+        "webpage_url",
+        "duration",
+        "thumbnail",
+        "uploader",
+        "view_count",
+        "acodec",
+        "asr",
+        "expires_at",
+        "warm_source",
+    )
+
+    def __init__(self, query, requester, info=None):
+        self.query = query
+        # เก็บแค่ id ไม่ถือ Member ไว้ตลอดอายุของเพลง
+        self.requester_id = getattr(requester, "id", requester)
+        self.video_id = None
+        self.title = query
+        self.url = None
+        self.webpage_url = None
+        self.duration = 0
+        self.thumbnail = None
+        self.uploader = "Unknown Artist"
+        self.view_count = 0
+        self.acodec = None
+        self.asr = None
+        self.expires_at = 0.0
+        self.warm_source = None
+        if info is not None:
+            self.update(info)
+
+    @classmethod
+    def from_flat(cls, entry, requester):
+        # entry จาก extract_flat มีแค่ข้อมูลพื้นฐาน ยังไม่มีลิงก์ stream
+        video_id = entry.get("id")
+        track = cls(
+            entry.get("url") or f"https://www.youtube.com/watch?v={video_id}",
+            requester,
+        )
+        track.video_id = video_id
+        track.title = entry.get("title") or track.query
+        track.duration = entry.get("duration") or 0
+        track.uploader = entry.get("uploader") or entry.get("channel") or "Unknown Artist"
+        track.view_count = entry.get("view_count") or 0
+        thumbnails = entry.get("thumbnails")
+        if thumbnails:
+            track.thumbnail = thumbnails[-1].get("url")
+        return track
+
+    @classmethod
+    def from_dict(cls, data, requester):
+        track = cls(data["query"], requester)
+        for field in SAVED_FIELDS:
+            if field in data:
+                setattr(track, field, data[field])
+        return track
+
+    def to_dict(self):
+        data = {field: getattr(self, field) for field in SAVED_FIELDS}
+        data["requester_id"] = self.requester_id
+        return data
+
+    def update(self, info):
+        self.video_id = info.get("id") or self.video_id
+        self.title = info.get("title") or "Unknown Title"
+        self.url = info.get("url")
+        self.webpage_url = info.get("webpage_url") or self.webpage_url
+        self.duration = info.get("duration") or 0
+        self.thumbnail = info.get("thumbnail")
+        self.uploader = info.get("uploader") or "Unknown Artist"
+        self.view_count = info.get("view_count") or 0
+        self.acodec = info.get("acodec")
+        self.asr = info.get("asr")
+        expires_at = stream_expiry(self.url)
+        if expires_at is None:
+            expires_at = time.time() + settings.RESOLVER_CACHE_TTL
+        self.expires_at = expires_at
+
+    @property
+    def resolved(self):
+        return self.url is not None
+
+    @property
+    def source_query(self):
+        # ใช้ลิงก์ของวิดีโอที่ resolve แล้ว เพื่อให้ได้เพลงเดิมเสมอ
+        return self.webpage_url or self.query
+
+    def is_stale(self, margin=30):
+        return not self.resolved or self.expires_at - margin <= time.time()
+
+    def take_source(self):
+        source, self.warm_source = self.warm_source, None
+        return source
+
+    def release(self):
+        source = self.take_source()
+        if source is not None:
+            source.cleanup()
+
+    def __repr__(self):
+        return f"<Track {self.video_id or self.query!r} {self.title!r}>"
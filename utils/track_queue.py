@@ -0,0 +1,237 @@
+import random
+from collections import deque
+
+
+class _Node:
+    __slots__ = ("track", "priority", "size", "left", "right")
+
+    def __init__(self, track):
+        self.track = track
+        self.priority = random.random()
+        self.size = 1
+        self.left = None
+        self.right = None
+
+
+def _size(node):
+    return node.size if node else 0
+
+
+def _update(node):
+    node.size = 1 + _size(node.left) + _size(node.right)
+
+
+def _split(node, k):
+    # แบ่ง treap เป็น (k ตัวแรก, ที่เหลือ)
+    if node is None:
+        return None, None
+    if _size(node.left) >= k:
+        left, node.left = _split(node.left, k)
+        _update(node)
+        return left, node
+    node.right, right = _split(node.right, k - _size(node.left) - 1)
+    _update(node)
+    return node, right
+
+
+def _merge(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a.priority > b.priority:
+        a.right = _merge(a.right, b)
+        _update(a)
+        return a
+    b.left = _merge(a, b.left)
+    _update(b)
+    return b
+
+
+class QueueFull(Exception):
+    """Raised when a guild's queue or the global track budget is full."""
+
+
+class AlreadyQueued(Exception):
+    """Raised when QUEUE_DEDUPE is on and the video is already waiting."""
+
+
+class TrackCounter:
+    """Running total of tracks held by every queue and history sharing it."""
+
+    __slots__ = ("held",)
+
+    def __init__(self):
+        self.held = 0
+
+
+class TrackHistory:
+    """Most recent first ring of played tracks, counted in a TrackCounter."""
+
+    __slots__ = ("_tracks", "_counter")
+
+    def __init__(self, maxlen, counter=None):
+        self._tracks = deque(maxlen=maxlen)
+        self._counter = counter or TrackCounter()
+
+    def __len__(self):
+        return len(self._tracks)
+
+    def __bool__(self):
+        return bool(self._tracks)
+
+    def __iter__(self):
+        return iter(self._tracks)
+
+    def appendleft(self, track):
+        # deque ที่เต็มแล้วจะทิ้งตัวเก่าสุดเอง จำนวนรวมจึงไม่เปลี่ยน
+        if len(self._tracks) != self._tracks.maxlen:
+            self._counter.held += 1
+        self._tracks.appendleft(track)
+
+    def popleft(self):
+        track = self._tracks.popleft()
+        self._counter.held -= 1
+        return track
+
+    def pop(self):
+        track = self._tracks.pop()
+        self._counter.held -= 1
+        return track
+
+    def clear(self):
+        self._counter.held -= len(self._tracks)
+        self._tracks.clear()
+
+
+class TrackQueue:
+    """Ordered track queue backed by an implicit treap.
+
+    Indexing, insert/remove at any position, move and random pick are all
+    O(log n); iteration is in queue order. Video ids are counted so
+    duplicate checks are O(1), and every add or remove is reflected in
+    the shared TrackCounter.
+    """
+
+    def __init__(self, tracks=(), counter=None):
+        self._root = None
+        self._videos = {}
+        self._counter = counter or TrackCounter()
+        for track in tracks:
+            self.append(track)
+
+    def __len__(self):
+        return _size(self._root)
+
+    def __bool__(self):
+        return self._root is not None
+
+    def __iter__(self):
+        stack = []
+        node = self._root
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            yield node.track
+            node = node.right
+
+    def _index(self, index):
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("queue index out of range")
+        return index
+
+    def __getitem__(self, index):
+        index = self._index(index)
+        node = self._root
+        while True:
+            left = _size(node.left)
+            if index < left:
+                node = node.left
+            elif index == left:
+                return node.track
+            else:
+                index -= left + 1
+                node = node.right
+
+    def __delitem__(self, index):
+        self.pop_at(index)
+
+    def _count(self, track, delta):
+        self._counter.held += delta
+        video_id = track.video_id
+        if not video_id:
+            return
+        count = self._videos.get(video_id, 0) + delta
+        if count > 0:
+            self._videos[video_id] = count
+        else:
+            self._videos.pop(video_id, None)
+
+    def insert(self, index, track):
+        size = len(self)
+        if index < 0:
+            index = max(0, index + size)
+        left, right = _split(self._root, min(index, size))
+        self._root = _merge(_merge(left, _Node(track)), right)
+        self._count(track, 1)
+
+    def append(self, track):
+        self._root = _merge(self._root, _Node(track))
+        self._count(track, 1)
+
+    def appendleft(self, track):
+        self._root = _merge(_Node(track), self._root)
+        self._count(track, 1)
+
+    def extend(self, tracks):
+        for track in tracks:
+            self.append(track)
+
+    def pop_at(self, index):
+        index = self._index(index)
+        left, rest = _split(self._root, index)
+        node, right = _split(rest, 1)
+        self._root = _merge(left, right)
+        self._count(node.track, -1)
+        return node.track
+
+    def popleft(self):
+        return self.pop_at(0)
+
+    def pop(self):
+        return self.pop_at(-1)
+
+    def pop_random(self):
+        return self.pop_at(random.randrange(len(self)))
+
+    def move(self, src, dst):
+        track = self.pop_at(src)
+        self.insert(dst, track)
+        return track
+
+    def contains_video(self, video_id):
+        return video_id in self._videos
+
+    def dedupe(self):
+        seen = set()
+        kept = []
+        for track in self:
+            if track.video_id and track.video_id in seen:
+                continue
+            seen.add(track.video_id)
+            kept.append(track)
+        removed = len(self) - len(kept)
+        if removed:
+            self.clear()
+            self.extend(kept)
+        return removed
+
+    def clear(self):
+        self._counter.held -= len(self)
+        self._root = None
+        self._videos.clear()
@@ -0,0 +1,93 @@
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger("music.ytdl")
+
+_yt_dlp = None
+_import_lock = threading.Lock()
+import_seconds = None
+
+
+def load_yt_dlp():
+    """Import yt-dlp on first use; it is the slowest import in the bot."""
+    global _yt_dlp, import_seconds
+    if _yt_dlp is None:
+        with _import_lock:
+            if _yt_dlp is None:
+                started = time.perf_counter()
+                module = importlib.import_module("yt_dlp")
+                import_seconds = time.perf_counter() - started
+                logger.info(f"Imported yt-dlp in {import_seconds:.2f}s")
+                _yt_dlp = module
+    return _yt_dlp
+
+
+class YDLPool:
+    """One long-lived YoutubeDL per worker thread for a given option set.
+
+    Reusing an instance keeps its extractors, cookie jar and HTTP
+    connections alive between lookups. Instances are recycled after
+    ``max_uses`` extractions or as soon as one raises.
+    """
+
+    def __init__(self, options, max_uses=200):
+        self.options = options
+        self.max_uses = max_uses
+        self.created = 0
+        self._local = threading.local()
+        self._instances = set()
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        ydl = getattr(self._local, "ydl", None)
+        if ydl is None:
+            ydl = load_yt_dlp().YoutubeDL(self.options)
+            self._local.ydl = ydl
+            self._local.uses = 0
+            with self._lock:
+                self._instances.add(ydl)
+                self.created += 1
+        return ydl
+
+    def _discard(self):
+        ydl = getattr(self._local, "ydl", None)
+        if ydl is None:
+            return
+        self._local.ydl = None
+        with self._lock:
+            self._instances.discard(ydl)
+        try:
+            ydl.close()
+        except Exception as e:
+            logger.debug(f"Error closing YoutubeDL: {e}")
+
+    def extract_info(self, query, **kwargs):
+        ydl = self._acquire()
+        try:
+            info = ydl.extract_info(query, download=False, **kwargs)
+        except Exception:
+            self._discard()
+            raise
+        self._local.uses += 1
+        if self._local.uses >= self.max_uses:
+            self._discard()
+        return info
+
+    def prewarm(self, ie_key="Youtube"):
+        """Import yt-dlp and load the extractor used for most lookups."""
+        ydl = load_yt_dlp().YoutubeDL(self.options)
+        try:
+            ydl.get_info_extractor(ie_key)
+        finally:
+            ydl.close()
+
+    def close(self):
+        with self._lock:
+            instances, self._instances = self._instances, set()
+        for ydl in instances:
+            try:
+                ydl.close()
+            except Exception:
+                pass